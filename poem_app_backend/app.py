@@ -1,14 +1,22 @@
-from flask import Flask, send_from_directory, current_app
+from flask import Flask, send_from_directory, current_app, request, jsonify
 from flask_cors import CORS
 from config import Config
 from routes.auth import auth_bp
 from routes.articles import articles_bp
 from routes.comments import comments_bp
 from routes.generate import generate_bp
-from models.supabase_client import supabase_client
+from models.supabase_client import supabase_client, make_excerpt
 from models.supabase_auth_client import supabase_auth_client
 from routes.upload import upload_bp
 from routes.cloudflare import cloudflare_bp
+from utils.token_cache import token_cache
+from utils.profile_cache import profile_cache
+from utils.password_hasher import bcrypt_pool
+from utils.legacy_migration import legacy_migrator
+from utils.feed_cache import feed_cache
+from utils.image_jobs import image_jobs
+from utils.search_index import search_index
+import hmac
 import os
 
 from dotenv import load_dotenv
@@ -27,6 +35,15 @@ def create_app():
     try:
         supabase_client.init_app(app)
         supabase_auth_client.init_app(app)
+        token_cache.init_app(app)
+        token_cache.attach_store(supabase_client.save_token_revocation, supabase_client.load_token_revocations)
+        bcrypt_pool.init_app(app)
+        feed_cache.init_app(app)
+        profile_cache.init_app(app)
+        image_jobs.init_app(app)
+        search_index.init_app(app)
+        if app.config.get('SEARCH_INDEX_WARM', True):
+            search_index.warm(supabase_client.iter_articles, make_excerpt)
         
         # 简化连接测试，减少启动时间
         if supabase_client.supabase is None:
@@ -62,6 +79,30 @@ def create_app():
     def health():
         return {'status': 'healthy'}
     
+    @app.route('/metrics')
+    def metrics():
+        """
+        进程内缓存统计，仅供内部使用
+        配置METRICS_TOKEN时需携带 Authorization: Bearer <METRICS_TOKEN>，未配置时只允许本机访问
+        """
+        metrics_token = current_app.config.get('METRICS_TOKEN')
+        if metrics_token:
+            allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {metrics_token}')
+        else:
+            allowed = request.remote_addr in ('127.0.0.1', '::1')
+        if not allowed:
+            return jsonify({'error': 'Not Found'}), 404
+        return {
+            'token_cache': token_cache.stats(),
+            'profile_cache': profile_cache.stats(),
+            'bcrypt_pool': bcrypt_pool.stats(),
+            'refresh_grace_cache': supabase_auth_client.refresh_grace_cache.stats(),
+            'legacy_migration': legacy_migrator.stats(),
+            'feed_cache': feed_cache.stats(),
+            'image_jobs': image_jobs.stats(),
+            'search_index': search_index.stats()
+        }
+    
     @app.route('/uploads/<filename>')
     def uploaded_file(filename):
         """提供上传文件的访问"""
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+认证中间件基准测试
+使用本地模拟的Supabase服务，分别测量 hybrid_auth_required / require_auth / optional_auth
+在Supabase token、旧系统HS256 token、过期token和无效token下，1/8/32并发时的吞吐和延迟
+
+用法: python bench_auth.py [--requests 200] [--latency 0.02] [--verify local|remote] [--no-token-cache]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import jwt
+
+from fake_supabase import FakeSupabaseServer, JWT_SECRET, make_anon_key, make_supabase_token
+
+LEGACY_SECRET = 'bench-legacy-secret'
+CONCURRENCY_LEVELS = (1, 8, 32)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='认证中间件基准测试')
+    parser.add_argument('--requests', type=int, default=200, help='每个并发客户端的请求数')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟Supabase的网络延迟（秒）')
+    parser.add_argument('--verify', choices=('local', 'remote'), default='local', help='Supabase token验证模式')
+    parser.add_argument('--no-token-cache', action='store_true', help='关闭已验证token缓存')
+    return parser.parse_args()
+
+def build_app(server, args):
+    """指向模拟服务创建应用，并注册三个使用不同认证装饰器的测试路由"""
+    os.environ.update({
+        'SUPABASE_URL': server.url,
+        'SUPABASE_KEY': make_anon_key(),
+        'SUPABASE_JWT_SECRET': JWT_SECRET,
+        'SUPABASE_JWT_VERIFY': args.verify,
+        'SECRET_KEY': LEGACY_SECRET,
+        'TOKEN_CACHE_TTL': '0' if args.no_token_cache else os.environ.get('TOKEN_CACHE_TTL', '300')
+    })
+    from app import create_app
+    from utils.auth_middleware import require_auth, optional_auth
+    from utils.hybrid_auth_middleware import hybrid_auth_required
+
+    app = create_app()
+
+    def view():
+        return {'ok': True}
+
+    decorators = {
+        'hybrid_auth_required': hybrid_auth_required,
+        'require_auth': require_auth,
+        'optional_auth': optional_auth
+    }
+    for name, decorator in decorators.items():
+        app.add_url_rule(f'/bench/{name}', f'bench_{name}', decorator(view))
+    return app, list(decorators)
+
+def build_tokens(server):
+    server.add_row('users', {
+        'id': 'legacy-user',
+        'email': 'legacy-user@example.com',
+        'username': 'legacy-user',
+        'created_at': '2023-01-01T00:00:00Z'
+    })
+    return {
+        'supabase': make_supabase_token('bench-user', url=server.url),
+        'legacy': jwt.encode({
+            'user_id': 'legacy-user',
+            'exp': datetime.utcnow() + timedelta(days=1)
+        }, LEGACY_SECRET, algorithm='HS256'),
+        'expired': make_supabase_token('bench-user', ttl=-60, url=server.url),
+        'garbage': 'not-a-jwt'
+    }
+
+def run_case(app, path, token, concurrency, requests_per_client):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def client_loop():
+        client = app.test_client()
+        local_latencies = []
+        local_statuses = Counter()
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[response.status_code] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'ops': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'status': ','.join(f'{code}x{count}' for code, count in sorted(statuses.items()))
+    }
+
+def main():
+    args = parse_args()
+    # 日志输出会显著影响计时
+    logging.disable(logging.CRITICAL)
+
+    server = FakeSupabaseServer(latency=args.latency).start()
+    app, decorator_names = build_app(server, args)
+    tokens = build_tokens(server)
+
+    print(f"🔍 认证中间件基准测试 (verify={args.verify}, token缓存={'关' if args.no_token_cache else '开'}, "
+          f"模拟延迟={args.latency * 1000:.0f}ms, 每客户端{args.requests}次请求)")
+    print(f"{'装饰器':<22}{'token':<10}{'并发':>5}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'上游/请求':>10}  状态码")
+    for name in decorator_names:
+        for token_type, token in tokens.items():
+            for concurrency in CONCURRENCY_LEVELS:
+                upstream_before = server.request_count
+                result = run_case(app, f'/bench/{name}', token, concurrency, args.requests)
+                upstream = (server.request_count - upstream_before) / (concurrency * args.requests)
+                print(f"{name:<22}{token_type:<10}{concurrency:>5}{result['ops']:>10.0f}"
+                      f"{result['p50']:>10.2f}{result['p99']:>10.2f}{upstream:>10.2f}  {result['status']}")
+    server.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+认证客户端并发压力检查
+启动本地模拟的Supabase Auth服务，在多线程下并发调用verify_token/get_user/update_password/sign_in，
+确认每个请求拿到的都是自己token对应的用户，没有跨请求的session串用
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from fake_supabase import FakeSupabaseServer, make_anon_key, make_supabase_token
+from models.supabase_auth_client import SupabaseAuthClient
+
+THREADS = 64
+ITERATIONS = 20
+
+def check_worker(client, user_id, errors):
+    token = make_supabase_token(user_id)
+    for _ in range(ITERATIONS):
+        checks = {
+            'verify_token': lambda: client.verify_token(token)['user'].id,
+            'get_user': lambda: client.get_user(token)['user'].id,
+            'sign_in': lambda: client.sign_in(f'{user_id}@example.com', 'password')['user'].id,
+        }
+        for name, call in checks.items():
+            try:
+                seen = call()
+            except Exception as e:
+                errors.append(f'{name} 异常: {e}')
+                continue
+            if seen != user_id:
+                errors.append(f'{name} 串用: 期望 {user_id}，实际 {seen}')
+        if not client.update_password(token, 'new-password')['success']:
+            errors.append(f'update_password 失败: {user_id}')
+
+def main():
+    print(f"🔍 认证客户端并发检查: {THREADS} 线程 x {ITERATIONS} 次")
+    # 每次响应前随机等待以放大线程交错
+    server = FakeSupabaseServer(jitter=0.005).start()
+    app = Flask(__name__)
+    app.config.update(
+        SUPABASE_URL=server.url,
+        SUPABASE_KEY=make_anon_key(),
+        SUPABASE_JWT_VERIFY='remote'
+    )
+    client = SupabaseAuthClient()
+    client.init_app(app)
+
+    errors = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        for i in range(THREADS):
+            pool.submit(check_worker, client, f'user{i:02d}', errors)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    if errors:
+        print(f"❌ 发现 {len(errors)} 个问题，例如:")
+        for error in errors[:10]:
+            print(f"  - {error}")
+        return 1
+    print(f"✅ 未发现跨请求串用，耗时 {elapsed:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
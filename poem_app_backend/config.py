@@ -11,6 +11,52 @@ class Config:
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
     
+    # Supabase JWT本地验证配置
+    # SUPABASE_JWT_VERIFY=local 时优先在本地校验签名/过期/受众/签发者，remote 则每次调用Auth API
+    SUPABASE_JWT_VERIFY = os.environ.get('SUPABASE_JWT_VERIFY', 'local')
+    SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')
+    SUPABASE_JWT_AUDIENCE = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+    SUPABASE_JWT_ISSUER = os.environ.get('SUPABASE_JWT_ISSUER')  # 默认为 SUPABASE_URL/auth/v1
+    SUPABASE_JWKS_TTL = int(os.environ.get('SUPABASE_JWKS_TTL', 600))  # JWKS缓存秒数
+    REFRESH_GRACE_SECONDS = int(os.environ.get('REFRESH_GRACE_SECONDS', 10))  # 相同refresh token重复刷新时返回同一新session的时长
+    
+    # 已验证token缓存配置
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 4096))
+    TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))  # 秒，同时不超过token自身的exp
+    # 各worker从数据库同步登出撤销记录的间隔（秒），即登出在其他worker上生效的最长延迟
+    TOKEN_REVOCATION_SYNC_INTERVAL = float(os.environ.get('TOKEN_REVOCATION_SYNC_INTERVAL', 1))
+    # 每个worker保留的撤销记录上限，超出时无法确定的token改为远程验证
+    TOKEN_REVOCATION_LIMIT = int(os.environ.get('TOKEN_REVOCATION_LIMIT', 100000))
+    
+    # /metrics 访问令牌，未配置时只允许本机访问
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # 用户资料缓存配置（旧用户表和Supabase Auth用户共用）
+    PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 2048))
+    PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 300))  # 秒
+    
+    # 首页/第一页文章列表缓存配置（秒），TTL为0时关闭
+    FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 10))
+    FEED_CACHE_STALE_TTL = int(os.environ.get('FEED_CACHE_STALE_TTL', 60))  # 过期后仍可先返回旧数据并后台刷新的时长
+    
+    # bcrypt密码校验线程池配置（旧系统登录/迁移）
+    BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+    BCRYPT_QUEUE_LIMIT = int(os.environ.get('BCRYPT_QUEUE_LIMIT', 8))
+    BCRYPT_TIMEOUT = int(os.environ.get('BCRYPT_TIMEOUT', 10))
+    BCRYPT_RETRY_AFTER = int(os.environ.get('BCRYPT_RETRY_AFTER', 2))
+    
+    # 旧用户登录成功后是否在登录请求中自动迁移到Supabase Auth（Supabase开启邮箱验证时不迁移）
+    LEGACY_AUTO_MIGRATE = os.environ.get('LEGACY_AUTO_MIGRATE', 'true').lower() == 'true'
+    
+    # 文章AI配图后台任务配置
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    IMAGE_JOB_TIMEOUT = int(os.environ.get('IMAGE_JOB_TIMEOUT', 300))  # 秒，超过后仍无图片视为失败
+    
+    # 搜索索引定期全量重建间隔（秒），用于同步其他进程的写入
+    SEARCH_INDEX_REBUILD_INTERVAL = int(os.environ.get('SEARCH_INDEX_REBUILD_INTERVAL', 600))
+    # 启动时在后台预先加载搜索索引
+    SEARCH_INDEX_WARM = os.environ.get('SEARCH_INDEX_WARM', 'true').lower() == 'true'
+    
     # 邮件配置
     EMAIL_USERNAME = os.environ.get('EMAIL_USERNAME')
     EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD')
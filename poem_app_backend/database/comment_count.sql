@@ -0,0 +1,37 @@
+-- 文章评论数（反范式）
+-- 由评论表触发器维护 articles.comment_count，列表接口直接读取该列，无需逐篇统计评论
+-- 需要在部署读取 comment_count 的后端版本之前执行
+
+-- 添加评论数列
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0;
+
+-- 回填已有评论数
+UPDATE articles a
+SET comment_count = c.total
+FROM (
+    SELECT article_id, COUNT(*) AS total
+    FROM comments
+    GROUP BY article_id
+) c
+WHERE a.id = c.article_id;
+
+-- 评论新增/删除时更新评论数
+-- 使用SECURITY DEFINER，评论者不是文章作者时也能绕过文章表的更新策略
+CREATE OR REPLACE FUNCTION public.update_article_comment_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE articles SET comment_count = comment_count + 1 WHERE id = NEW.article_id;
+        RETURN NEW;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE articles SET comment_count = GREATEST(comment_count - 1, 0) WHERE id = OLD.article_id;
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS on_comment_changed ON comments;
+CREATE TRIGGER on_comment_changed
+    AFTER INSERT OR DELETE ON comments
+    FOR EACH ROW EXECUTE FUNCTION public.update_article_comment_count();
@@ -95,6 +95,13 @@ CREATE TRIGGER on_auth_user_created
 -- 创建索引以提高查询性能
 CREATE INDEX IF NOT EXISTS idx_articles_user_id ON articles(user_id);
 CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles(created_at DESC);
+-- 游标分页按 (created_at, id) 排序和过滤
+CREATE INDEX IF NOT EXISTS idx_articles_created_at_id ON articles(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_articles_user_created_at_id ON articles(user_id, created_at DESC, id DESC);
+-- 按标签过滤（tags @> '{标签}'）
+CREATE INDEX IF NOT EXISTS idx_articles_tags ON articles USING GIN (tags);
 CREATE INDEX IF NOT EXISTS idx_comments_article_id ON comments(article_id);
+-- 评论游标分页
+CREATE INDEX IF NOT EXISTS idx_comments_article_created_at_id ON comments(article_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_comments_user_id ON comments(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_profiles_username ON user_profiles(username);
\ No newline at end of file
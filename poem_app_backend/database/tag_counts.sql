@@ -0,0 +1,48 @@
+-- 标签文章数（反范式）
+-- 由文章表触发器维护 tag_counts，/api/tags 直接按文章数读取，无需扫描文章表
+-- 需要在部署读取 tag_counts 的后端版本之前执行
+
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag TEXT PRIMARY KEY,
+    article_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- 按文章数量排序读取最常用标签
+CREATE INDEX IF NOT EXISTS idx_tag_counts_article_count ON tag_counts(article_count DESC, tag);
+
+ALTER TABLE tag_counts ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Anyone can view tag counts" ON tag_counts;
+CREATE POLICY "Anyone can view tag counts" ON tag_counts
+    FOR SELECT USING (true);
+
+-- 回填已有文章的标签数（同一篇文章中重复的标签只计一次）
+INSERT INTO tag_counts (tag, article_count)
+SELECT t.tag, COUNT(*)
+FROM articles a
+CROSS JOIN LATERAL (SELECT DISTINCT unnest(a.tags) AS tag) t
+GROUP BY t.tag
+ON CONFLICT (tag) DO UPDATE SET article_count = EXCLUDED.article_count;
+
+-- 文章新增/删除/修改标签时更新标签数
+-- 使用SECURITY DEFINER，普通用户写文章时也能更新标签数表
+CREATE OR REPLACE FUNCTION public.update_tag_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE tag_counts SET article_count = GREATEST(article_count - 1, 0)
+        WHERE tag IN (SELECT DISTINCT unnest(OLD.tags));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO tag_counts (tag, article_count)
+        SELECT DISTINCT unnest(NEW.tags), 1
+        ON CONFLICT (tag) DO UPDATE SET article_count = tag_counts.article_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS on_article_tags_changed ON articles;
+CREATE TRIGGER on_article_tags_changed
+    AFTER INSERT OR DELETE OR UPDATE OF tags ON articles
+    FOR EACH ROW EXECUTE FUNCTION public.update_tag_counts();
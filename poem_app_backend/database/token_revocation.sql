@@ -0,0 +1,47 @@
+-- 登出撤销记录
+-- 多个worker共享：登出时写入，各worker定期增量同步到本地，
+-- 本地验证JWT时拒绝已撤销的token（Supabase token按session撤销）
+-- key 为 'session:<session_id>' 的SHA-256摘要，不保存token或session ID本身
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    key TEXT PRIMARY KEY,
+    expires_at BIGINT NOT NULL,  -- token过期的Unix时间戳，之后记录可删除
+    revoked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
+
+ALTER TABLE revoked_tokens ENABLE ROW LEVEL SECURITY;
+
+-- 记录只有摘要，所有worker都需要读取；没有写入策略，只能通过下面的函数写入
+DROP POLICY IF EXISTS "Anyone can read revoked tokens" ON revoked_tokens;
+CREATE POLICY "Anyone can read revoked tokens" ON revoked_tokens
+    FOR SELECT USING (true);
+
+-- 旧版本的写入函数允许匿名写入任意记录，删除
+DROP FUNCTION IF EXISTS public.revoke_token(TEXT, BIGINT);
+
+-- 撤销调用者自己的session：撤销键和过期时间都取自调用者已由PostgREST验证的JWT，
+-- 调用者无法写入其他session或任意记录；顺带清理已过期记录
+CREATE OR REPLACE FUNCTION public.revoke_current_session()
+RETURNS VOID AS $$
+DECLARE
+    v_session_id TEXT := auth.jwt() ->> 'session_id';
+    v_expires_at BIGINT := (auth.jwt() ->> 'exp')::BIGINT;
+BEGIN
+    IF v_session_id IS NULL OR v_expires_at IS NULL THEN
+        RAISE EXCEPTION 'token has no session';
+    END IF;
+    DELETE FROM revoked_tokens WHERE expires_at < EXTRACT(EPOCH FROM NOW());
+    INSERT INTO revoked_tokens (key, expires_at)
+    VALUES (encode(sha256(convert_to('session:' || v_session_id, 'UTF8')), 'hex'), v_expires_at)
+    ON CONFLICT (key) DO UPDATE
+    SET expires_at = GREATEST(revoked_tokens.expires_at, EXCLUDED.expires_at),
+        revoked_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 只有已登录用户（authenticated角色）可以调用
+REVOKE EXECUTE ON FUNCTION public.revoke_current_session() FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.revoke_current_session() TO authenticated;
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+本地模拟的Supabase服务（Auth + PostgREST的最小子集）
+供并发检查和基准测试脚本使用，不连接真实的Supabase项目
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import jwt
+
+JWT_SECRET = 'fake-supabase-jwt-secret'
+
+def make_supabase_token(user_id, ttl=3600, url=None):
+    """签发与Supabase Auth格式一致的访问令牌"""
+    now = int(time.time())
+    claims = {
+        'sub': user_id,
+        'email': f'{user_id}@example.com',
+        'aud': 'authenticated',
+        'role': 'authenticated',
+        'user_metadata': {'username': user_id},
+        'iat': now,
+        'exp': now + ttl
+    }
+    if url:
+        claims['iss'] = f'{url}/auth/v1'
+    return jwt.encode(claims, JWT_SECRET, algorithm='HS256')
+
+def make_anon_key():
+    return jwt.encode({'role': 'anon'}, JWT_SECRET, algorithm='HS256')
+
+def user_payload(user_id):
+    return {
+        'id': user_id,
+        'aud': 'authenticated',
+        'email': f'{user_id}@example.com',
+        'app_metadata': {},
+        'user_metadata': {'username': user_id},
+        'created_at': '2024-01-01T00:00:00Z',
+        'email_confirmed_at': '2024-01-01T00:00:00Z'
+    }
+
+class FakeSupabaseHandler(BaseHTTPRequestHandler):
+    """模拟GoTrue的 /user、/token、/logout 与 PostgREST 的表查询"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _simulate_latency(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.jitter:
+            time.sleep(random.uniform(0, server.jitter))
+
+    def _user_id_from_header(self):
+        auth_header = self.headers.get('Authorization', '')
+        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
+        try:
+            return jwt.decode(token, JWT_SECRET, algorithms=['HS256'], audience='authenticated',
+                              options={'verify_iss': False})['sub']
+        except jwt.InvalidTokenError:
+            return None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _table_rows(self, path, query):
+        """按 PostgREST 的 eq./in. 过滤返回表数据"""
+        table = path.rsplit('/', 1)[-1]
+        rows = list(self.server.tables.get(table, {}).values())
+        for column, values in query.items():
+            condition = values[0]
+            if condition.startswith('eq.'):
+                rows = [row for row in rows if str(row.get(column)) == condition[3:]]
+            elif condition.startswith('in.('):
+                wanted = condition[4:-1].split(',')
+                rows = [row for row in rows if str(row.get(column)) in wanted]
+        return rows
+
+    def do_GET(self):
+        self._simulate_latency()
+        parsed = urlparse(self.path)
+        if parsed.path == '/auth/v1/user':
+            user_id = self._user_id_from_header()
+            if not user_id:
+                return self._send(401, {'msg': 'invalid JWT'})
+            return self._send(200, user_payload(user_id))
+        if parsed.path == '/auth/v1/.well-known/jwks.json':
+            return self._send(200, {'keys': []})
+        if parsed.path.startswith('/rest/v1/'):
+            query = {k: v for k, v in parse_qs(parsed.query).items() if k not in ('select', 'order', 'limit', 'offset')}
+            return self._send(200, self._table_rows(parsed.path, query))
+        self._send(404, {'msg': 'not found'})
+
+    def do_PUT(self):
+        self._simulate_latency()
+        self._read_json()
+        user_id = self._user_id_from_header()
+        if not user_id:
+            return self._send(401, {'msg': 'invalid JWT'})
+        self._send(200, user_payload(user_id))
+
+    def do_POST(self):
+        self._simulate_latency()
+        data = self._read_json()
+        if urlparse(self.path).path == '/auth/v1/token':
+            user_id = data.get('email', '').split('@')[0]
+            return self._send(200, {
+                'access_token': make_supabase_token(user_id),
+                'refresh_token': uuid.uuid4().hex,
+                'expires_in': 3600,
+                'token_type': 'bearer',
+                'user': user_payload(user_id)
+            })
+        self._send(204, {})
+
+class FakeSupabaseServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        super().__init__(('127.0.0.1', 0), FakeSupabaseHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.request_count = 0
+        # 表名 -> {主键: 行}
+        self.tables = {'users': {}}
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def add_row(self, table, row):
+        self.tables.setdefault(table, {})[row['id']] = row
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
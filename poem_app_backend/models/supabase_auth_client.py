@@ -2,25 +2,102 @@
 Supabase认证客户端 - 使用Supabase Auth服务
 符合Supabase安全策略和RLS要求
 """
-from supabase.client import create_client, Client
+from supabase.client import create_client, Client, ClientOptions
+from gotrue import SyncGoTrueClient
 from gotrue.errors import AuthError
+from gotrue.helpers import parse_user_response
+import hashlib
+import jwt
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any
+from utils.single_flight import SingleFlight
+from utils.ttl_cache import TTLCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 本地验证支持的签名算法：HS256使用项目JWT Secret，非对称算法使用JWKS
+LOCAL_JWT_ALGORITHMS = ('HS256', 'RS256', 'ES256')
+
+class ClaimsUser:
+    """
+    由已验证的JWT声明构造的用户对象
+    与Supabase Auth返回的User对象保持相同的常用属性
+    """
+    __slots__ = ('id', 'email', 'phone', 'role', 'aud', 'session_id',
+                 'user_metadata', 'app_metadata', 'email_confirmed_at', 'created_at', 'exp')
+
+    def __init__(self, claims: Dict[str, Any]):
+        self.id = claims['sub']
+        self.email = claims.get('email', '')
+        self.phone = claims.get('phone', '')
+        self.role = claims.get('role')
+        self.aud = claims.get('aud')
+        self.session_id = claims.get('session_id')
+        self.user_metadata = claims.get('user_metadata') or {}
+        self.app_metadata = claims.get('app_metadata') or {}
+        # Supabase只为已确认邮箱的用户签发token，email_verified为False时视为未确认
+        if self.user_metadata.get('email_verified', True):
+            self.email_confirmed_at = datetime.fromtimestamp(claims.get('iat', claims['exp']), tz=timezone.utc).isoformat()
+        else:
+            self.email_confirmed_at = None
+        # token声明中不包含用户创建时间
+        self.created_at = None
+        self.exp = claims['exp']
+
 class SupabaseAuthClient:
     def __init__(self):
         self.supabase: Optional[Client] = None
+        self.local_verify = False
+        self.jwt_secret: Optional[str] = None
+        self.jwt_audience = 'authenticated'
+        self.jwt_issuer: Optional[str] = None
+        self._jwks_client: Optional[jwt.PyJWKClient] = None
+        # 同一refresh token的并发刷新只调用一次上游，成功结果在短时间内继续返回给迟到的请求
+        self._refresh_flight = SingleFlight()
+        self.refresh_grace_cache = TTLCache(maxsize=1024, ttl=10)
+        # GoTrue公开设置（是否自动确认邮箱等），很少变化
+        self._settings_cache = TTLCache(maxsize=1, ttl=600)
 
     def init_app(self, app):
         """初始化Supabase客户端"""
+        # 服务端不保存/自动刷新session，所有按用户的调用都显式传入token，多线程worker间互不干扰
         self.supabase = create_client(
             app.config['SUPABASE_URL'],
-            app.config['SUPABASE_KEY']
+            app.config['SUPABASE_KEY'],
+            options=ClientOptions(auto_refresh_token=False, persist_session=False)
+        )
+        
+        # 本地JWT验证配置
+        auth_url = f"{app.config['SUPABASE_URL'].rstrip('/')}/auth/v1"
+        self.local_verify = app.config.get('SUPABASE_JWT_VERIFY', 'local') == 'local'
+        self.jwt_secret = app.config.get('SUPABASE_JWT_SECRET')
+        self.jwt_audience = app.config.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+        self.jwt_issuer = app.config.get('SUPABASE_JWT_ISSUER') or auth_url
+        # PyJWKClient缓存签名密钥，kid未命中（密钥轮换）时才会重新拉取JWKS
+        self._jwks_client = jwt.PyJWKClient(
+            f"{auth_url}/.well-known/jwks.json",
+            cache_keys=True,
+            lifespan=app.config.get('SUPABASE_JWKS_TTL', 600),
+            headers={'apikey': app.config['SUPABASE_KEY']},
+            timeout=5
+        )
+        self.refresh_grace_cache = TTLCache(maxsize=1024, ttl=app.config.get('REFRESH_GRACE_SECONDS', 10))
+
+    def _session_auth(self) -> SyncGoTrueClient:
+        """
+        为单次调用创建独立的GoTrue客户端
+        登录/注册/刷新等会写入session的操作在这个客户端上进行，不污染共享客户端；底层HTTP连接池仍然共享
+        """
+        auth = self.supabase.auth
+        return SyncGoTrueClient(
+            url=auth._url,
+            headers=auth._headers,
+            http_client=auth._http_client,
+            auto_refresh_token=False,
+            persist_session=False
         )
 
     def sign_up(self, email: str, password: str, username: str = None) -> Dict[str, Any]:
@@ -39,7 +116,7 @@ class SupabaseAuthClient:
                 user_metadata['display_name'] = username
             
             # 使用Supabase Auth注册
-            response = self.supabase.auth.sign_up({
+            response = self._session_auth().sign_up({
                 "email": email,
                 "password": password,
                 "options": {
@@ -74,6 +151,25 @@ class SupabaseAuthClient:
                 'error': '注册过程中发生错误'
             }
 
+    def email_autoconfirm(self) -> bool:
+        """
+        注册后是否无需邮箱验证即可登录（GoTrue设置 mailer_autoconfirm）
+        查询失败时按需要验证处理
+        """
+        if not self.supabase:
+            raise RuntimeError("Supabase client not initialized")
+        
+        autoconfirm = self._settings_cache.get('mailer_autoconfirm')
+        if autoconfirm is None:
+            try:
+                settings = self.supabase.auth._request('GET', 'settings', xform=lambda data: data)
+                autoconfirm = bool(settings.get('mailer_autoconfirm'))
+            except Exception as e:
+                logger.error(f"获取Supabase Auth设置失败: {e}")
+                return False
+            self._settings_cache.set('mailer_autoconfirm', autoconfirm)
+        return autoconfirm
+
     def sign_in(self, email: str, password: str) -> Dict[str, Any]:
         """
         用户登录 - 使用Supabase Auth
@@ -82,7 +178,7 @@ class SupabaseAuthClient:
             raise RuntimeError("Supabase client not initialized")
         
         try:
-            response = self.supabase.auth.sign_in_with_password({
+            response = self._session_auth().sign_in_with_password({
                 "email": email,
                 "password": password
             })
@@ -123,9 +219,8 @@ class SupabaseAuthClient:
             raise RuntimeError("Supabase client not initialized")
         
         try:
-            # 设置session
-            self.supabase.auth.set_session(access_token, None)
-            response = self.supabase.auth.sign_out()
+            # 直接携带用户token调用登出接口，不设置共享session
+            self.supabase.auth.admin.sign_out(access_token)
             
             return {
                 'success': True,
@@ -173,12 +268,14 @@ class SupabaseAuthClient:
             raise RuntimeError("Supabase client not initialized")
         
         try:
-            # 设置当前session
-            self.supabase.auth.set_session(access_token, None)
-            
-            response = self.supabase.auth.update_user({
-                "password": new_password
-            })
+            # 直接携带用户token调用 PUT /user，不依赖任何session
+            response = self.supabase.auth._request(
+                "PUT",
+                "user",
+                jwt=access_token,
+                body={"password": new_password},
+                xform=parse_user_response
+            )
             
             if response.user:
                 return {
@@ -212,10 +309,8 @@ class SupabaseAuthClient:
             raise RuntimeError("Supabase client not initialized")
         
         try:
-            # 设置session
-            self.supabase.auth.set_session(access_token, None)
-            
-            response = self.supabase.auth.get_user()
+            # 直接携带用户token获取用户信息，不设置共享session
+            response = self.supabase.auth.get_user(access_token)
             
             if response.user:
                 return {
@@ -244,20 +339,34 @@ class SupabaseAuthClient:
     def refresh_session(self, refresh_token: str) -> Dict[str, Any]:
         """
         刷新session
+        并发的相同refresh token共享一次上游调用；宽限期内重复刷新直接返回同一个新session，
+        避免后到的请求因refresh token已被使用而失败
         """
         if not self.supabase:
             raise RuntimeError("Supabase client not initialized")
         
+        key = hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+        cached = self.refresh_grace_cache.get(key)
+        if cached:
+            return cached
+        
+        result, _ = self._refresh_flight.do(key, lambda: self._refresh_session_upstream(key, refresh_token))
+        return result
+
+    def _refresh_session_upstream(self, key: str, refresh_token: str) -> Dict[str, Any]:
+        """调用Supabase Auth刷新session，成功时写入宽限缓存"""
         try:
-            response = self.supabase.auth.refresh_session(refresh_token)
+            response = self._session_auth().refresh_session(refresh_token)
             
             if response.session:
-                return {
+                result = {
                     'success': True,
                     'session': response.session,
                     'access_token': response.session.access_token,
                     'refresh_token': response.session.refresh_token
                 }
+                self.refresh_grace_cache.set(key, result)
+                return result
             else:
                 return {
                     'success': False,
@@ -277,17 +386,98 @@ class SupabaseAuthClient:
                 'error': 'Session刷新过程中发生错误'
             }
 
-    def verify_token(self, access_token: str) -> Dict[str, Any]:
+    def verify_token_locally(self, access_token: str) -> Optional[Dict[str, Any]]:
+        """
+        在本地验证访问令牌的签名、过期时间、受众和签发者
+        无法在本地得出结论时（缺少密钥、JWKS中找不到kid、密钥可能已轮换）返回None，由调用方回退到远程验证
+        """
+        try:
+            header = jwt.get_unverified_header(access_token)
+        except jwt.InvalidTokenError:
+            return {
+                'success': False,
+                'valid': False,
+                'error': 'Token无效'
+            }
+        
+        algorithm = header.get('alg')
+        if algorithm not in LOCAL_JWT_ALGORITHMS:
+            return {
+                'success': False,
+                'valid': False,
+                'error': 'Token无效'
+            }
+        
+        if algorithm == 'HS256':
+            if not self.jwt_secret:
+                return None
+            key = self.jwt_secret
+        else:
+            if not self._jwks_client:
+                return None
+            try:
+                key = self._jwks_client.get_signing_key(header.get('kid')).key
+            except jwt.PyJWKClientError as e:
+                logger.warning(f"JWKS获取签名密钥失败，回退到远程验证: {e}")
+                return None
+        
+        try:
+            claims = jwt.decode(
+                access_token,
+                key,
+                algorithms=[algorithm],
+                audience=self.jwt_audience,
+                issuer=self.jwt_issuer,
+                options={'require': ['exp', 'sub']}
+            )
+        except jwt.ExpiredSignatureError:
+            return {
+                'success': False,
+                'valid': False,
+                'error': 'Token无效或已过期'
+            }
+        except jwt.InvalidSignatureError:
+            # 签发者不是本项目的token（如旧系统token）直接判定无效；
+            # 签发者正确但签名不匹配可能是项目密钥已轮换，交给远程验证确认
+            unverified = jwt.decode(access_token, options={'verify_signature': False})
+            if unverified.get('iss') != self.jwt_issuer:
+                return {
+                    'success': False,
+                    'valid': False,
+                    'error': 'Token无效'
+                }
+            return None
+        except jwt.InvalidTokenError:
+            return {
+                'success': False,
+                'valid': False,
+                'error': 'Token无效'
+            }
+        
+        return {
+            'success': True,
+            'user': ClaimsUser(claims),
+            'valid': True,
+            'claims': claims
+        }
+
+    def verify_token(self, access_token: str, remote: bool = False) -> Dict[str, Any]:
         """
         验证访问令牌
+        本地验证模式下优先校验JWT，仅在本地无法判断时调用Supabase Auth API
+        remote为True时（如无法确定token是否已登出）直接调用Supabase Auth API
         """
         if not self.supabase:
             raise RuntimeError("Supabase client not initialized")
         
+        if self.local_verify and not remote:
+            local_result = self.verify_token_locally(access_token)
+            if local_result is not None:
+                return local_result
+        
         try:
-            # 设置session并获取用户信息来验证token
-            self.supabase.auth.set_session(access_token, None)
-            response = self.supabase.auth.get_user()
+            # 携带token获取用户信息来验证token
+            response = self.supabase.auth.get_user(access_token)
             
             if response.user:
                 return {
@@ -1,10 +1,43 @@
 from supabase.client import create_client, Client
 import os
 import uuid
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 import bcrypt
 from typing import Optional, Union
 import re
+from utils.pagination import apply_keyset, split_page
+from utils.feed_cache import feed_cache
+from utils.search_index import search_index
+from utils.profile_cache import profile_cache
+
+# 各接口使用的文章列投影
+# card/owner 会读取content用于生成摘要，返回前移除正文
+# comment_count 由 database/comment_count.sql 中的触发器维护
+ARTICLE_PROJECTIONS = {
+    'card': 'id,title,author,tags,image_url,like_count,comment_count,created_at,content',
+    'owner': 'id,user_id,title,author,tags,image_url,like_count,comment_count,created_at,content',
+    'detail': 'id,user_id,title,content,author,tags,image_url,like_count,comment_count,created_at'
+}
+ARTICLE_EXCERPT_VIEWS = ('card', 'owner')
+EXCERPT_MAX_LINES = 2
+EXCERPT_MAX_CHARS = 48
+COMMENT_COLUMNS = 'id,article_id,user_id,content,created_at'
+
+# 撤销记录分页大小，不超过PostgREST默认的最大返回行数
+REVOCATION_PAGE_SIZE = 1000
+
+def make_excerpt(content: Optional[str]) -> str:
+    """取正文前几行作为摘要，超出长度时以省略号结尾"""
+    if not content:
+        return ''
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    excerpt = '\n'.join(lines[:EXCERPT_MAX_LINES])
+    if len(excerpt) > EXCERPT_MAX_CHARS:
+        return excerpt[:EXCERPT_MAX_CHARS].rstrip() + '…'
+    if len(lines) > EXCERPT_MAX_LINES:
+        return excerpt + '…'
+    return excerpt
 
 class SupabaseClient:
     def __init__(self):
@@ -44,6 +77,155 @@ class SupabaseClient:
         result = self.supabase.table('users').select('*').eq('id', user_id).execute()
         return result.data[0] if result.data else None
 
+    def _load_profiles(self, user_ids: list) -> dict:
+        """
+        批量查询用户资料，返回 {用户ID: 资料}
+        先查旧用户表，剩余ID再查Supabase Auth用户的user_profiles，最多两次查询
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        profiles = {}
+        result = self.supabase.table('users').select('id,email,username,created_at').in_('id', user_ids).execute()
+        for row in result.data:
+            profiles[row['id']] = {
+                'id': row['id'],
+                'email': row.get('email') or '',
+                'username': row.get('username') or '',
+                'display_name': row.get('username') or '',
+                'created_at': row.get('created_at'),
+                'source': 'legacy'
+            }
+        remaining = [user_id for user_id in user_ids if user_id not in profiles]
+        if remaining:
+            profiles.update(self._load_supabase_profiles(remaining))
+        return profiles
+
+    def _load_supabase_profiles(self, user_ids: list) -> dict:
+        """只查询Supabase Auth用户的user_profiles，返回 {用户ID: 资料}"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        profiles = {}
+        # user_profiles 不保存邮箱；公开接口也不返回Supabase用户的邮箱
+        result = self.supabase.table('user_profiles').select('id,username,display_name,created_at').in_('id', user_ids).execute()
+        for row in result.data:
+            profiles[row['id']] = {
+                'id': row['id'],
+                'email': '',
+                'username': row.get('username') or '',
+                'display_name': row.get('display_name') or row.get('username') or '',
+                'created_at': row.get('created_at'),
+                'source': 'supabase'
+            }
+        return profiles
+
+    def get_profiles(self, user_ids: list) -> dict:
+        """通过用户资料缓存批量获取用户资料，返回 {用户ID: 资料}"""
+        return profile_cache.get_many(user_ids, self._load_profiles)
+
+    def get_profile(self, user_id: str, source: Optional[str] = None):
+        """
+        通过用户资料缓存获取单个用户资料，不存在时返回None
+        已知是Supabase Auth用户时（source='supabase'）未命中只查询user_profiles
+        """
+        load = self._load_supabase_profiles if source == 'supabase' else self._load_profiles
+        return profile_cache.get(user_id, load)
+
+    def get_created_at(self, user_id: str, source: Optional[str] = None):
+        """用户注册时间：优先使用长期缓存，未缓存时读取用户资料"""
+        created_at = profile_cache.created_at(user_id)
+        if created_at is None:
+            profile = self.get_profile(user_id, source=source)
+            created_at = profile['created_at'] if profile else None
+        return created_at
+
+    def remember_auth_user(self, user) -> None:
+        """
+        用已验证的Supabase Auth用户元数据更新资料缓存，元数据中的用户名变化后随之更新
+        登录、注册、刷新返回的完整用户对象带有注册时间，由token声明构造的用户沿用已缓存的注册时间
+        不缓存邮箱：资料会出现在公开的评论列表中，且必须与从user_profiles加载的结果一致
+        """
+        created_at = getattr(user, 'created_at', None)
+        if isinstance(created_at, datetime):
+            created_at = created_at.isoformat()
+        if created_at is None:
+            created_at = profile_cache.created_at(user.id)
+            if created_at is None:
+                # 尚未缓存注册时间时留给user_profiles加载
+                return
+        metadata = getattr(user, 'user_metadata', None) or {}
+        username = metadata.get('username') or ''
+        profile = {
+            'id': user.id,
+            'email': '',
+            'username': username,
+            'display_name': metadata.get('display_name') or username,
+            'created_at': created_at,
+            'source': 'supabase'
+        }
+        profile_cache.put(profile)
+
+    def save_token_revocation(self, access_token: str) -> None:
+        """
+        撤销token所属的session（database/token_revocation.sql 中的revoke_current_session函数）
+        以用户自己的token调用，数据库根据token声明计算撤销键，只能撤销自己的session
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        query = self.supabase.rpc('revoke_current_session', {})
+        query.headers['Authorization'] = f'Bearer {access_token}'
+        query.execute()
+
+    def load_token_revocations(self, since: Optional[float] = None) -> list:
+        """
+        读取token撤销记录，按撤销键分页读取全部结果
+        since为空时读取所有未过期的记录，否则读取该时间戳之后写入的记录
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        rows = []
+        last_key = None
+        while True:
+            query = self.supabase.table('revoked_tokens').select('key,expires_at')
+            if since is None:
+                query = query.gt('expires_at', int(time.time()))
+            else:
+                query = query.gt('revoked_at', datetime.fromtimestamp(since, tz=timezone.utc).isoformat())
+            if last_key is not None:
+                query = query.gt('key', last_key)
+            page = query.order('key').limit(REVOCATION_PAGE_SIZE).execute().data
+            rows.extend(page)
+            if len(page) < REVOCATION_PAGE_SIZE:
+                return rows
+            last_key = page[-1]['key']
+
+    def count_legacy_users(self) -> int:
+        """统计仍在旧用户表中的用户数量"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('users').select('id', count='exact').limit(1).execute()
+        return result.count or 0
+
+    def migrate_legacy_user_data(self, old_user_id: str, new_user_id: str):
+        """将旧用户的文章和评论转移到新的Supabase Auth用户，并删除旧用户记录"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        self.supabase.table('articles').update({'user_id': new_user_id}).eq('user_id', old_user_id).execute()
+        self.supabase.table('comments').update({'user_id': new_user_id}).eq('user_id', old_user_id).execute()
+        self.supabase.table('users').delete().eq('id', old_user_id).execute()
+        profile_cache.invalidate(old_user_id)
+        feed_cache.invalidate()
+
+    def _select_articles(self, view: str):
+        """按投影名称构造文章查询，未知名称按detail处理"""
+        return self.supabase.table('articles').select(ARTICLE_PROJECTIONS.get(view, ARTICLE_PROJECTIONS['detail']))
+
+    def _project_articles(self, rows: list, view: str) -> list:
+        """card/owner投影用摘要替换正文"""
+        if view in ARTICLE_EXCERPT_VIEWS:
+            for row in rows:
+                row['excerpt'] = make_excerpt(row.pop('content', None))
+        return rows
+
     def _format_image_url(self, url: Optional[str]) -> str:
         """将Cloudflare图片URL统一为自定义域名格式，并确保返回非None值"""
         if not url:
@@ -59,9 +241,9 @@ class SupabaseClient:
         """创建文章"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        user_info = self.get_user_by_id(user_id)
-        if user_info:
-            author_name = author or user_info.get('username', user_info.get('email', '匿名'))
+        profile = self.get_profile(user_id)
+        if profile:
+            author_name = author or profile['username'] or profile['email'] or '匿名'
         else:
             author_name = author or '匿名'
         article_data = {
@@ -79,37 +261,103 @@ class SupabaseClient:
         except:
             pass
         result = self.supabase.table('articles').insert(article_data).execute()
+        feed_cache.invalidate()
+        if result.data:
+            search_index.add(result.data[0], make_excerpt(content))
         return result.data[0] if result.data else None
 
-    def get_all_articles(self, page: int = 1, per_page: int = 10):
-        """获取所有文章（支持分页）"""
+    def _filter_tag(self, query, tag: Optional[str]):
+        """按标签过滤（tags @> '{tag}'，使用GIN索引）"""
+        if not tag:
+            return query
+        escaped = tag.replace('\\', '\\\\').replace('"', '\\"')
+        return query.contains('tags', f'{{"{escaped}"}}')
+
+    def get_all_articles(self, page: int = 1, per_page: int = 10, view: str = 'detail', tag: Optional[str] = None):
+        """获取所有文章（支持分页和按标签过滤）"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         start_index = (page - 1) * per_page
         end_index = start_index + per_page - 1
-        result = self.supabase.table('articles').select('*').order('created_at', desc=True).range(start_index, end_index).execute()
-        return result.data
+        query = self._filter_tag(self._select_articles(view), tag)
+        result = query.order('created_at', desc=True).range(start_index, end_index).execute()
+        return self._project_articles(result.data, view)
+
+    def get_articles_page(self, cursor: Optional[str] = None, per_page: int = 10, view: str = 'detail',
+                          tag: Optional[str] = None):
+        """游标分页获取文章（可按标签过滤），返回 (文章列表, 下一页游标)"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        query = apply_keyset(self._filter_tag(self._select_articles(view), tag), cursor, per_page + 1)
+        articles, next_cursor = split_page(query.execute().data, per_page)
+        return self._project_articles(articles, view), next_cursor
+
+    def iter_articles(self, page_size: int = 200):
+        """按页读取全部文章（含正文）并逐条产出，用于重建搜索索引"""
+        cursor = None
+        while True:
+            articles, cursor = self.get_articles_page(cursor, page_size)
+            yield from articles
+            if not cursor:
+                return
 
     def get_article_by_id(self, article_id: str):
         """根据ID获取文章"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('articles').select('*').eq('id', article_id).execute()
+        result = self._select_articles('detail').eq('id', article_id).execute()
         return result.data[0] if result.data else None
 
-    def get_articles_by_user(self, user_id: str):
+    def get_articles_by_ids(self, article_ids: list, view: str = 'detail'):
+        """一次查询获取多篇文章，返回顺序与数据库一致，由调用方重新排序"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        if not article_ids:
+            return []
+        result = self._select_articles(view).in_('id', article_ids).execute()
+        return self._project_articles(result.data, view)
+
+    def article_exists(self, article_id: str) -> bool:
+        """只查询ID判断文章是否存在"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('articles').select('id').eq('id', article_id).execute()
+        return bool(result.data)
+
+    def get_articles_by_user(self, user_id: str, view: str = 'detail'):
         """获取用户的所有文章"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('articles').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
-        return result.data
+        result = self._select_articles(view).eq('user_id', user_id).order('created_at', desc=True).execute()
+        return self._project_articles(result.data, view)
+
+    def get_articles_by_user_page(self, user_id: str, cursor: Optional[str] = None, per_page: int = 10, view: str = 'detail'):
+        """游标分页获取用户的文章，返回 (文章列表, 下一页游标)"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        query = apply_keyset(self._select_articles(view).eq('user_id', user_id), cursor, per_page + 1)
+        articles, next_cursor = split_page(query.execute().data, per_page)
+        return self._project_articles(articles, view), next_cursor
+
+    def iter_articles_by_user(self, user_id: str, view: str = 'detail', page_size: int = 50):
+        """按页从数据库读取用户的全部文章并逐条产出，内存中最多保留一页"""
+        cursor = None
+        while True:
+            articles, cursor = self.get_articles_by_user_page(user_id, cursor, page_size, view=view)
+            yield from articles
+            if not cursor:
+                return
 
     def delete_article(self, article_id: str, user_id: str):
-        """删除文章（仅作者可删除）"""
+        """删除文章（仅作者可删除），返回被删除的行，未删除时返回None"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         result = self.supabase.table('articles').delete().eq('id', article_id).eq('user_id', user_id).execute()
-        return len(result.data) > 0
+        if not result.data:
+            return None
+        feed_cache.invalidate()
+        search_index.remove(article_id)
+        return result.data[0]
 
     def update_article_image(self, article_id: str, image_url: Optional[str]):
         """更新文章图片URL，写入前统一格式"""
@@ -117,14 +365,27 @@ class SupabaseClient:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         formatted_url = self._format_image_url(image_url)
         result = self.supabase.table('articles').update({'image_url': formatted_url}).eq('id', article_id).execute()
+        feed_cache.invalidate()
+        if result.data:
+            search_index.add(result.data[0], make_excerpt(result.data[0].get('content')))
         return result.data[0] if result.data else None
 
-    def update_article_fields(self, article_id: str, update_data: dict):
-        """根据ID更新文章部分字段"""
+    def update_article_fields(self, article_id: str, update_data: dict, user_id: Optional[str] = None):
+        """
+        根据ID更新文章部分字段
+        传入user_id时只更新该用户的文章，未更新任何行时返回None
+        """
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('articles').update(update_data).eq('id', article_id).execute()
-        return result.data[0] if result.data else None
+        query = self.supabase.table('articles').update(update_data).eq('id', article_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        result = query.execute()
+        if not result.data:
+            return None
+        feed_cache.invalidate()
+        search_index.add(result.data[0], make_excerpt(result.data[0].get('content')))
+        return result.data[0]
 
     def create_comment(self, article_id: str, user_id: str, content: str):
         """创建评论"""
@@ -140,27 +401,86 @@ class SupabaseClient:
         result = self.supabase.table('comments').insert(comment_data).execute()
         return result.data[0] if result.data else None
 
-    def get_comments_by_article(self, article_id: str):
-        """获取文章的所有评论"""
+    def get_top_tags(self, limit: int = 20) -> list:
+        """按文章数量降序返回标签及数量，数量由 database/tag_counts.sql 中的触发器维护"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('comments').select('*').eq('article_id', article_id).order('created_at', desc=True).execute()
-        return result.data
+        query = self.supabase.table('tag_counts').select('tag,article_count').gt('article_count', 0)
+        # 与 (article_count DESC, tag) 索引顺序一致
+        query.params = query.params.add('order', 'article_count.desc,tag')
+        result = query.limit(limit).execute()
+        return [{'tag': row['tag'], 'count': row['article_count']} for row in result.data]
 
-    def get_recent_articles(self, limit=10):
+    def get_comment_counts(self, article_ids: list) -> dict:
+        """一次查询获取多篇文章的评论数，返回 {文章ID: 评论数}"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        if not article_ids:
+            return {}
+        result = self.supabase.table('articles').select('id,comment_count').in_('id', list(article_ids)).execute()
+        return {row['id']: row.get('comment_count') or 0 for row in result.data}
+
+    def count_comments(self, article_id: str) -> int:
+        """统计文章的评论数量（只返回计数，不读取评论内容）"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('comments').select('id', count='exact').eq('article_id', article_id).limit(1).execute()
+        return result.count or 0
+
+    def get_comments_page(self, article_id: str, cursor: Optional[str] = None, per_page: int = 20):
+        """
+        游标分页获取文章评论（最新在前），返回 (评论列表, 下一页游标, 评论总数)
+        第一页在同一次查询中取得精确总数，后续页单独执行计数查询
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        query = self.supabase.table('comments').select(COMMENT_COLUMNS, count=None if cursor else 'exact')
+        result = apply_keyset(query.eq('article_id', article_id), cursor, per_page + 1).execute()
+        comments, next_cursor = split_page(result.data, per_page)
+        total = self.count_comments(article_id) if cursor else (result.count or 0)
+        return comments, next_cursor, total
+
+    def get_article_with_comments(self, article_id: str, per_page: int = 20):
+        """
+        一次查询获取文章及其第一页评论（最新在前），返回 (文章, 评论列表, 下一页游标, 评论总数)
+        评论通过外键嵌入同一个select，总数取自触发器维护的comment_count；文章不存在时返回None
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        query = self.supabase.table('articles').select(f"{ARTICLE_PROJECTIONS['detail']},comments({COMMENT_COLUMNS})")
+        result = apply_keyset(query.eq('id', article_id), None, per_page + 1, foreign_table='comments').execute()
+        if not result.data:
+            return None
+        article = result.data[0]
+        comments, next_cursor = split_page(article.pop('comments', None) or [], per_page)
+        return article, comments, next_cursor, article.get('comment_count') or 0
+
+    def get_recent_articles(self, limit=10, view: str = 'card'):
         """获取最新的文章列表"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('articles').select('*').order('created_at', desc=True).limit(limit).execute()
-        return result.data
+        result = self._select_articles(view).order('created_at', desc=True).limit(limit).execute()
+        return self._project_articles(result.data, view)
 
-    def delete_comment(self, comment_id):
+    def delete_comment(self, comment_id, user_id: Optional[str] = None):
+        """删除评论，传入user_id时只删除该用户的评论；返回被删除的行，未删除时返回None"""
         if self.supabase is None:
             from flask import current_app
             self.init_app(current_app)
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized")
-        return self.supabase.table('comments').delete().eq('id', comment_id).execute()
+        query = self.supabase.table('comments').delete().eq('id', comment_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        result = query.execute()
+        return result.data[0] if result.data else None
+
+    def comment_exists(self, comment_id) -> bool:
+        """只查询ID判断评论是否存在"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('comments').select('id').eq('id', comment_id).execute()
+        return bool(result.data)
 
     def get_comment_by_id(self, comment_id):
         if self.supabase is None:
@@ -168,7 +488,7 @@ class SupabaseClient:
             self.init_app(current_app)
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized")
-        result = self.supabase.table('comments').select('*').eq('id', comment_id).execute()
+        result = self.supabase.table('comments').select(COMMENT_COLUMNS).eq('id', comment_id).execute()
         if result.data:
             return result.data[0]
         return None
@@ -1,29 +1,167 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from models.supabase_client import supabase_client
-from utils.ai_image_generator import ai_generator
+from utils.image_jobs import image_jobs, IMAGE_READY, IMAGE_FAILED
 from utils.hybrid_auth_middleware import hybrid_auth_required, get_current_user_id, get_current_user
+from utils.pagination import clamp_per_page, InvalidCursor
+from utils.feed_cache import feed_cache
+from utils.etag import encode_json, conditional_json
+from utils.search_index import search_index
+from models.supabase_client import make_excerpt
+from routes.comments import format_comments, COMMENTS_PER_PAGE
+import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 articles_bp = Blueprint('articles', __name__)
 
+MAX_BATCH_SIZE = 100
+MAX_QUERY_LENGTH = 100
+MAX_TAG_LENGTH = 50
+MAX_TAGS_LIMIT = 100
+_ARTICLE_ID_RE = re.compile(r'^[\w-]{1,64}$')
+
+def get_view_arg(default: str, allowed: tuple):
+    """读取 ?view= 投影参数，不在允许范围内时返回None"""
+    view = request.args.get('view', default)
+    return view if view in allowed else None
+
 @articles_bp.route('/articles/home', methods=['GET'])
 def get_home_articles():
-    """获取首页文章数据"""
+    """获取首页文章数据（默认为卡片投影，?view=detail 返回正文）"""
+    view = get_view_arg('card', ('card', 'detail'))
+    if not view:
+        return jsonify({'error': '无效的view参数'}), 400
     try:
-        recent_articles = supabase_client.get_recent_articles(limit=10)
-        return jsonify({'recent_articles': recent_articles}), 200
+        # 缓存已序列化的响应体，命中时无需再编码，ETag匹配时直接返回304
+        encoded = feed_cache.get(
+            ('home', view),
+            lambda: encode_json({'recent_articles': supabase_client.get_recent_articles(limit=10, view=view)})
+        )
+        return conditional_json(encoded)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @articles_bp.route('/articles', methods=['GET'])
 def get_articles():
-    """获取文章列表（分页）"""
+    """获取文章列表（分页）
+    传入cursor参数（首页为空字符串）时使用游标分页，返回next_cursor；否则按page/per_page分页
+    ?view=card 只返回卡片字段和摘要
+    ?tag= 只返回包含该标签的文章
+    """
+    view = get_view_arg('detail', ('card', 'detail'))
+    if not view:
+        return jsonify({'error': '无效的view参数'}), 400
+    tag = (request.args.get('tag') or '').strip() or None
+    if tag and len(tag) > MAX_TAG_LENGTH:
+        return jsonify({'error': f'标签不能超过{MAX_TAG_LENGTH}个字符'}), 400
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        articles = supabase_client.get_all_articles(page=page, per_page=per_page)
-        return jsonify({'articles': articles}), 200
+        per_page = clamp_per_page(request.args.get('per_page', type=int))
+        if 'cursor' in request.args:
+            cursor = request.args.get('cursor')
+
+            def load():
+                articles, next_cursor = supabase_client.get_articles_page(cursor, per_page, view=view, tag=tag)
+                return encode_json({'articles': articles, 'next_cursor': next_cursor})
+
+            # 只缓存不按标签过滤的第一页，后续页由游标定位，不受新文章影响
+            encoded = feed_cache.get(('cursor', per_page, view), load) if not cursor and not tag else load()
+            return conditional_json(encoded)
+        page = max(request.args.get('page', 1, type=int), 1)
+        load = lambda: encode_json({'articles': supabase_client.get_all_articles(page=page, per_page=per_page, view=view, tag=tag)})
+        encoded = feed_cache.get(('page', per_page, view), load) if page == 1 and not tag else load()
+        return conditional_json(encoded)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@articles_bp.route('/articles/search', methods=['GET'])
+def search_articles():
+    """按标题、正文、作者和标签搜索文章，按相关度排序并分页"""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': '搜索关键词不能为空'}), 400
+    if len(query) > MAX_QUERY_LENGTH:
+        return jsonify({'error': f'搜索关键词不能超过{MAX_QUERY_LENGTH}个字符'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = clamp_per_page(request.args.get('per_page', type=int))
+    try:
+        search_index.ensure_loaded(supabase_client.iter_articles, make_excerpt)
+        articles, total = search_index.search(query, offset=(page - 1) * per_page, limit=per_page)
+        # 索引中的评论数可能已过期，按本页文章批量刷新，失败时沿用索引中的值；
+        # 同一查询只返回仍然存在的文章，其他worker已删除的文章从结果和本地索引中移除
+        if articles:
+            try:
+                counts = supabase_client.get_comment_counts([article['id'] for article in articles])
+            except Exception as e:
+                logger.warning(f"刷新搜索结果评论数失败: {e}")
+            else:
+                existing = []
+                for article in articles:
+                    if article['id'] not in counts:
+                        search_index.remove(article['id'])
+                        continue
+                    article['comment_count'] = counts[article['id']]
+                    existing.append(article)
+                total -= len(articles) - len(existing)
+                articles = existing
+        return jsonify({
+            'articles': articles,
+            'total': total,
+            'page': page,
+            'per_page': per_page
+        }), 200
+    except Exception as e:
+        logger.error(f"搜索文章失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@articles_bp.route('/tags', methods=['GET'])
+def get_tags():
+    """按文章数量返回最常用的标签（?limit=，默认20）"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_TAGS_LIMIT)
+    try:
+        return jsonify({'tags': supabase_client.get_top_tags(limit)}), 200
+    except Exception as e:
+        logger.error(f"获取标签失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@articles_bp.route('/articles/batch', methods=['GET', 'POST'])
+def get_articles_batch():
+    """
+    批量获取文章
+    GET  /articles/batch?ids=id1,id2
+    POST /articles/batch  {"ids": [...]}（ID较多时使用）
+    按请求顺序返回，并列出不存在的ID
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        view = data.get('view', 'detail')
+    else:
+        ids = [i for i in request.args.get('ids', '').split(',') if i]
+        view = request.args.get('view', 'detail')
+    
+    if view not in ('card', 'detail'):
+        return jsonify({'error': '无效的view参数'}), 400
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': '文章ID列表不能为空'}), 400
+    if not all(isinstance(i, str) and _ARTICLE_ID_RE.match(i) for i in ids):
+        return jsonify({'error': '无效的文章ID'}), 400
+    # 去重并保持请求顺序
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'一次最多获取{MAX_BATCH_SIZE}篇文章'}), 400
+    
+    try:
+        found = {article['id']: article for article in supabase_client.get_articles_by_ids(ids, view=view)}
+        payload = {
+            'articles': [found[i] for i in ids if i in found],
+            'missing': [i for i in ids if i not in found]
+        }
+        if request.method == 'GET':
+            return conditional_json(encode_json(payload))
+        return jsonify(payload), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -47,45 +185,111 @@ def create_article():
         if not article:
             return jsonify({'error': '文章创建失败'}), 500
         
-        try:
-            image_url = None
-            if preview_image_url:
-                image_url = preview_image_url
-            else:
-                image_url = ai_generator.generate_poem_image(article)
-            
-            if image_url:
-                updated_article = supabase_client.update_article_image(article['id'], image_url)
+        # 已有预览图时直接写入；否则在后台生成AI配图，客户端通过image-status接口轮询
+        if preview_image_url:
+            image_status = IMAGE_READY
+            try:
+                updated_article = supabase_client.update_article_image(article['id'], preview_image_url)
                 if updated_article:
                     article = updated_article
-        except Exception as e:
-            print(f"图片处理失败: {str(e)}")
+            except Exception as e:
+                logger.error(f"图片处理失败: {e}")
+                image_status = IMAGE_FAILED
+        else:
+            image_status = image_jobs.submit(article)['status']
         
+        article['image_status'] = image_status
         return jsonify({'article': article}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _stream_user_articles(user_id: str, view: str):
+    """逐行输出用户文章，响应头已发出后出错只能记录日志并结束输出"""
+    try:
+        for article in supabase_client.iter_articles_by_user(user_id, view=view):
+            yield json.dumps(article, ensure_ascii=False, default=str) + '\n'
+    except Exception as e:
+        logger.error(f"输出用户文章列表失败: {user_id}, {e}")
+        yield json.dumps({'error': '文章列表读取失败'}, ensure_ascii=False) + '\n'
+
 @articles_bp.route('/articles/user/<user_id>', methods=['GET'])
 @hybrid_auth_required
 def get_user_articles(user_id):
-    """获取指定用户的文章列表"""
+    """获取指定用户的文章列表
+    ?view=owner 只返回列表字段和摘要
+    ?cursor= 游标分页，返回next_cursor
+    ?stream=ndjson 按页读取数据库并逐行输出NDJSON（每行一篇文章）
+    都不传时一次返回全部文章
+    """
     current_user_id = get_current_user_id()
     if user_id != current_user_id:
         return jsonify({'error': '无权限访问'}), 403
+    view = get_view_arg('detail', ('owner', 'detail'))
+    if not view:
+        return jsonify({'error': '无效的view参数'}), 400
     try:
-        articles = supabase_client.get_articles_by_user(user_id)
+        if request.args.get('stream') == 'ndjson':
+            return Response(stream_with_context(_stream_user_articles(user_id, view)),
+                            content_type='application/x-ndjson; charset=utf-8')
+        if 'cursor' in request.args:
+            per_page = clamp_per_page(request.args.get('per_page', type=int))
+            articles, next_cursor = supabase_client.get_articles_by_user_page(
+                user_id, request.args.get('cursor'), per_page, view=view
+            )
+            return jsonify({'articles': articles, 'next_cursor': next_cursor}), 200
+        articles = supabase_client.get_articles_by_user(user_id, view=view)
         return jsonify({'articles': articles}), 200
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @articles_bp.route('/articles/<article_id>', methods=['GET'])
 def get_article(article_id):
-    """获取单篇文章"""
+    """获取单篇文章，?include=comments 时在同一次查询中附带第一页评论"""
     try:
+        if request.args.get('include') == 'comments':
+            return _article_with_comments(article_id)
         article = supabase_client.get_article_by_id(article_id)
         if not article:
             return jsonify({'error': '文章不存在'}), 404
-        return jsonify({'article': article}), 200
+        return conditional_json(encode_json({'article': article}))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _article_with_comments(article_id):
+    """文章详情页：文章和第一页评论，评论字段与评论列表接口一致"""
+    per_page = clamp_per_page(request.args.get('per_page', type=int), default=COMMENTS_PER_PAGE)
+    found = supabase_client.get_article_with_comments(article_id, per_page)
+    if not found:
+        return jsonify({'error': '文章不存在'}), 404
+    article, comments, next_cursor, total = found
+    
+    # ETag由包含作者信息的响应体计算，作者改名后不会返回过期的304
+    return conditional_json(encode_json({
+        'article': article,
+        'comments': format_comments(comments),
+        'next_cursor': next_cursor,
+        'total': total
+    }))
+
+@articles_bp.route('/articles/<article_id>/image-status', methods=['GET'])
+def get_article_image_status(article_id):
+    """查询文章AI配图状态：pending / ready / failed"""
+    try:
+        job = image_jobs.status(article_id)
+        if job:
+            return jsonify({'article_id': article_id, 'image_status': job['status'], 'image_url': job['image_url']}), 200
+        
+        # 任务不在本进程时根据文章数据判断
+        article = supabase_client.get_article_by_id(article_id)
+        if not article:
+            return jsonify({'error': '文章不存在'}), 404
+        return jsonify({
+            'article_id': article_id,
+            'image_status': image_jobs.infer_status(article),
+            'image_url': article.get('image_url') or None
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -95,10 +299,6 @@ def update_article(article_id):
     """更新文章"""
     try:
         current_user_id = get_current_user_id()
-        article = supabase_client.get_article_by_id(article_id)
-        if not article or article['user_id'] != current_user_id:
-            return jsonify({'error': '无权限修改此文章'}), 403
-        
         data = request.get_json()
         update_data = {
             'title': data.get('title'),
@@ -106,7 +306,12 @@ def update_article(article_id):
             'tags': data.get('tags'),
             'author': data.get('author')
         }
-        updated_article = supabase_client.update_article_fields(article_id, update_data)
+        # 按ID和作者条件更新，未更新任何行时再区分文章不存在和无权限
+        updated_article = supabase_client.update_article_fields(article_id, update_data, user_id=current_user_id)
+        if not updated_article:
+            if not supabase_client.article_exists(article_id):
+                return jsonify({'error': '文章不存在'}), 404
+            return jsonify({'error': '无权限修改此文章'}), 403
         return jsonify({'article': updated_article}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -117,11 +322,10 @@ def delete_article(article_id):
     """删除文章"""
     try:
         current_user_id = get_current_user_id()
-        article = supabase_client.get_article_by_id(article_id)
-        if not article or article['user_id'] != current_user_id:
+        if not supabase_client.delete_article(article_id, current_user_id):
+            if not supabase_client.article_exists(article_id):
+                return jsonify({'error': '文章不存在'}), 404
             return jsonify({'error': '无权限删除此文章'}), 403
-        
-        supabase_client.delete_article(article_id, current_user_id)
         return jsonify({'message': '文章删除成功'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,12 +1,21 @@
 from flask import Blueprint, request, jsonify, current_app, render_template, redirect, url_for
 from models.supabase_auth_client import supabase_auth_client
-from utils.auth_middleware import require_auth, get_current_user, get_access_token
-from utils.hybrid_auth_middleware import hybrid_auth_required, is_legacy_user
+from utils.auth_middleware import require_auth, get_current_user, get_access_token, verify_supabase_token
+from utils.hybrid_auth_middleware import hybrid_auth_required, is_legacy_user, invalidate_legacy_user
+from utils.token_cache import token_cache
+from utils.password_hasher import bcrypt_pool, PasswordCheckBusy
+from utils.legacy_migration import legacy_migrator
 import logging
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 
+def password_check_busy_response():
+    """密码校验线程池已满时返回503"""
+    response = jsonify({'error': '登录请求过多，请稍后再试'})
+    response.headers['Retry-After'] = str(bcrypt_pool.retry_after)
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """用户注册 - 使用Supabase Auth"""
@@ -38,6 +47,10 @@ def register():
             user = result['user']
             session = result['session']
             
+            # 新用户资料写入缓存，覆盖之前可能缓存的“用户不存在”
+            from models.supabase_client import supabase_client
+            supabase_client.remember_auth_user(user)
+            
             response_data = {
                 'message': result['message'],
                 'user': {
@@ -84,6 +97,10 @@ def login():
             
             logger.info(f"Supabase Auth登录成功: {email}")
             
+            # 缓存完整用户资料（含注册时间），之后的 /me 无需查询
+            from models.supabase_client import supabase_client
+            supabase_client.remember_auth_user(user)
+            
             return jsonify({
                 'message': '登录成功',
                 'token': session.access_token,
@@ -101,7 +118,6 @@ def login():
             # Supabase Auth登录失败，尝试旧系统登录
             try:
                 from models.supabase_client import supabase_client
-                import bcrypt
                 
                 logger.info(f"尝试旧系统登录: {email}")
                 old_user = supabase_client.get_user_by_email(email)
@@ -119,8 +135,8 @@ def login():
                         hash_prefix = old_user['password_hash'][:10] if len(old_user['password_hash']) > 10 else "too_short"
                         logger.debug(f"密码哈希前缀: {hash_prefix}...")
                         
-                        # 验证密码 - 添加更多调试信息和错误处理
-                        password_bytes = password.encode('utf-8')
+                        # 只有经过bcrypt验证的密码才能用于自动迁移
+                        password_verified = False
                         
                         # 特殊处理：如果是测试密码"test123"，直接允许登录
                         if password == "test123":
@@ -137,10 +153,12 @@ def login():
                                 is_valid = False
                             else:
                                 try:
-                                    # 正常的bcrypt验证
-                                    hash_bytes = password_hash.encode('utf-8')
-                                    is_valid = bcrypt.checkpw(password_bytes, hash_bytes)
+                                    # 正常的bcrypt验证，在有界线程池中执行
+                                    is_valid = bcrypt_pool.checkpw(password, password_hash)
+                                    password_verified = is_valid
                                     logger.debug(f"密码验证结果: {is_valid}")
+                                except PasswordCheckBusy:
+                                    raise
                                 except Exception as hash_error:
                                     logger.error(f"bcrypt验证异常: {hash_error}")
                                     is_valid = False
@@ -148,6 +166,26 @@ def login():
                         if is_valid:
                             logger.info(f"旧密码验证成功: {email}")
                             
+                            # 用已验证的密码迁移到Supabase Auth，成功时直接返回Supabase session
+                            if password_verified and current_app.config.get('LEGACY_AUTO_MIGRATE', True):
+                                migrated = legacy_migrator.migrate(old_user, password)
+                                if migrated:
+                                    user = migrated['user']
+                                    session = migrated['session']
+                                    return jsonify({
+                                        'message': '登录成功，账户已升级',
+                                        'token': session.access_token,
+                                        'refresh_token': session.refresh_token,
+                                        'user': {
+                                            'id': user.id,
+                                            'email': user.email,
+                                            'username': user.user_metadata.get('username', '') if user.user_metadata else '',
+                                            'email_confirmed': user.email_confirmed_at is not None
+                                        },
+                                        'needs_migration': False,
+                                        'migrated': True
+                                    }), 200
+                            
                             # 生成JWT token
                             import jwt
                             from datetime import datetime, timedelta
@@ -173,6 +211,9 @@ def login():
                         else:
                             logger.warning(f"旧密码验证失败: {email}")
                             return jsonify({'error': '密码错误'}), 401
+                    except PasswordCheckBusy:
+                        logger.warning(f"密码校验线程池已满: {email}")
+                        return password_check_busy_response()
                     except Exception as hash_error:
                         logger.error(f"密码验证过程异常: {hash_error}")
                         return jsonify({'error': '密码验证失败，请联系客服'}), 500
@@ -246,6 +287,9 @@ def logout():
     try:
         access_token = get_access_token()
         
+        # 立即从已验证token缓存中移除
+        token_cache.revoke(access_token)
+        
         # 使用Supabase Auth登出
         result = supabase_auth_client.sign_out(access_token)
         
@@ -273,6 +317,9 @@ def refresh_token():
         
         if result['success']:
             session = result['session']
+            if session.user:
+                from models.supabase_client import supabase_client
+                supabase_client.remember_auth_user(session.user)
             return jsonify({
                 'message': 'Token刷新成功',
                 'token': session.access_token,
@@ -288,17 +335,23 @@ def refresh_token():
 @auth_bp.route('/me', methods=['GET'])
 @require_auth
 def get_current_user_info():
-    """获取当前用户信息"""
+    """获取当前用户信息（来自已验证的token声明，token声明中没有created_at时从用户资料读取）"""
     try:
         user = get_current_user()
         
+        created_at = user.created_at
+        if created_at is None:
+            # 注册时间在登录/刷新时已长期缓存，通常无需查询
+            from models.supabase_client import supabase_client
+            created_at = supabase_client.get_created_at(user.id, source='supabase')
+        
         return jsonify({
             'user': {
                 'id': user.id,
                 'email': user.email,
                 'username': user.user_metadata.get('username', '') if user.user_metadata else '',
                 'email_confirmed': user.email_confirmed_at is not None,
-                'created_at': user.created_at
+                'created_at': created_at
             }
         }), 200
         
@@ -316,8 +369,8 @@ def verify_token():
         if not access_token:
             return jsonify({'error': 'access_token不能为空'}), 400
         
-        # 验证token
-        result = supabase_auth_client.verify_token(access_token)
+        # 验证token：使用已验证token缓存和本地JWT声明，通常无需调用Supabase Auth
+        result = verify_supabase_token(access_token)
         
         if result['success'] and result['valid']:
             user = result['user']
@@ -354,13 +407,17 @@ def migrate_user():
         
         # 验证当前密码
         from models.supabase_client import supabase_client
-        import bcrypt
         
         old_user = supabase_client.get_user_by_email(email)
         if not old_user:
             return jsonify({'error': '用户不存在'}), 404
         
-        if not bcrypt.checkpw(current_password.encode('utf-8'), old_user['password_hash'].encode('utf-8')):
+        try:
+            password_valid = bcrypt_pool.checkpw(current_password, old_user['password_hash'])
+        except PasswordCheckBusy:
+            return password_check_busy_response()
+        
+        if not password_valid:
             return jsonify({'error': '当前密码错误'}), 401
         
         # 创建新的Supabase Auth用户
@@ -374,18 +431,9 @@ def migrate_user():
             # 更新文章和评论的用户ID
             try:
                 if session:  # 如果邮箱验证关闭，会有session
-                    # 更新文章
-                    supabase_client.supabase.table('articles').update({
-                        'user_id': user.id
-                    }).eq('user_id', old_user['id']).execute()
-                    
-                    # 更新评论
-                    supabase_client.supabase.table('comments').update({
-                        'user_id': user.id
-                    }).eq('user_id', old_user['id']).execute()
-                    
-                    # 删除旧用户记录
-                    supabase_client.supabase.table('users').delete().eq('id', old_user['id']).execute()
+                    # 转移文章和评论并删除旧用户记录
+                    supabase_client.migrate_legacy_user_data(old_user['id'], user.id)
+                    invalidate_legacy_user(old_user['id'])
                     
                     logger.info(f"用户迁移成功: {email}")
             except Exception as e:
@@ -445,7 +493,6 @@ def web_migrate():
     
     # 验证当前密码
     from models.supabase_client import supabase_client
-    import bcrypt
     
     old_user = supabase_client.get_user_by_email(email)
     if not old_user:
@@ -453,7 +500,15 @@ def web_migrate():
                                message='用户不存在', 
                                error='true'))
     
-    if not bcrypt.checkpw(current_password.encode('utf-8'), old_user['password_hash'].encode('utf-8')):
+    try:
+        password_valid = bcrypt_pool.checkpw(current_password, old_user['password_hash'])
+    except PasswordCheckBusy:
+        return render_template('migration_page.html', 
+                               email=email, 
+                               message='请求过多，请稍后再试', 
+                               error=True), 503, {'Retry-After': str(bcrypt_pool.retry_after)}
+    
+    if not password_valid:
         return redirect(url_for('auth.migration_page', 
                                email=email, 
                                message='当前密码错误', 
@@ -470,18 +525,9 @@ def web_migrate():
         # 更新文章和评论的用户ID
         try:
             if session:  # 如果邮箱验证关闭，会有session
-                # 更新文章
-                supabase_client.supabase.table('articles').update({
-                    'user_id': user.id
-                }).eq('user_id', old_user['id']).execute()
-                
-                # 更新评论
-                supabase_client.supabase.table('comments').update({
-                    'user_id': user.id
-                }).eq('user_id', old_user['id']).execute()
-                
-                # 删除旧用户记录
-                supabase_client.supabase.table('users').delete().eq('id', old_user['id']).execute()
+                # 转移文章和评论并删除旧用户记录
+                supabase_client.migrate_legacy_user_data(old_user['id'], user.id)
+                invalidate_legacy_user(old_user['id'])
                 
                 logger.info(f"用户迁移成功: {email}")
                 
@@ -527,9 +573,9 @@ def check_migration_status():
             # 如果能解码旧JWT，说明需要迁移
             user_id = payload['user_id']
             from models.supabase_client import supabase_client
-            old_user = supabase_client.get_user_by_id(user_id)
+            old_user = supabase_client.get_profile(user_id)
             
-            if old_user:
+            if old_user and old_user['source'] == 'legacy':
                 logger.info(f"检查迁移状态：找到旧用户 {old_user['email']}")
                 return jsonify({
                     'needs_migration': True,
@@ -1,15 +1,37 @@
 from flask import Blueprint, request, jsonify, current_app
 from models.supabase_client import supabase_client
 from utils.hybrid_auth_middleware import hybrid_auth_required, get_current_user_id, get_current_user
+from utils.etag import encode_json, conditional_json
+from utils.pagination import clamp_per_page, InvalidCursor
 import logging
 
 logger = logging.getLogger(__name__)
 comments_bp = Blueprint('comments', __name__)
 
+COMMENTS_PER_PAGE = 20
+
 def ensure_supabase():
     if supabase_client.supabase is None:
         supabase_client.init_app(current_app)
 
+def format_comments(comments):
+    """
+    格式化评论并补充作者信息
+    评论者资料走资料缓存，未命中的一次批量查询
+    """
+    authors = supabase_client.get_profiles([comment['user_id'] for comment in comments])
+    formatted_comments = []
+    for comment in comments:
+        comment_author = authors.get(comment['user_id'], {})
+        formatted_comments.append({
+            'id': comment['id'],
+            'content': comment['content'],
+            'author_email': comment_author.get('email', ''),
+            'author_username': comment_author.get('display_name', ''),
+            'created_at': comment['created_at']
+        })
+    return formatted_comments
+
 @comments_bp.route('/comments', methods=['POST'])
 @hybrid_auth_required
 def create_comment():
@@ -26,8 +48,7 @@ def create_comment():
             return jsonify({'error': '文章ID和评论内容不能为空'}), 400
         
         # 检查文章是否存在
-        article = supabase_client.get_article_by_id(article_id)
-        if not article:
+        if not supabase_client.article_exists(article_id):
             return jsonify({'error': '文章不存在'}), 404
         
         # 创建评论
@@ -52,32 +73,27 @@ def create_comment():
 
 @comments_bp.route('/articles/<article_id>/comments', methods=['GET'])
 def get_article_comments(article_id):
-    """获取文章的所有评论"""
+    """获取文章评论（游标分页，?cursor=<next_cursor>&per_page=20）"""
     try:
         # 检查文章是否存在
-        article = supabase_client.get_article_by_id(article_id)
-        if not article:
+        if not supabase_client.article_exists(article_id):
             return jsonify({'error': '文章不存在'}), 404
         
         # 获取评论
-        comments = supabase_client.get_comments_by_article(article_id)
-        
-        # 格式化评论数据
-        formatted_comments = []
-        for comment in comments:
-            comment_author = supabase_client.get_user_by_id(comment['user_id'])
-            formatted_comments.append({
-                'id': comment['id'],
-                'content': comment['content'],
-                'author_email': comment_author['email'] if comment_author else '',
-                'created_at': comment['created_at']
-            })
+        per_page = clamp_per_page(request.args.get('per_page', type=int), default=COMMENTS_PER_PAGE)
+        comments, next_cursor, total = supabase_client.get_comments_page(
+            article_id, request.args.get('cursor') or None, per_page
+        )
         
-        return jsonify({
-            'comments': formatted_comments,
-            'total': len(formatted_comments)
-        }), 200
+        # ETag由包含作者信息的响应体计算，作者改名后不会返回过期的304
+        return conditional_json(encode_json({
+            'comments': format_comments(comments),
+            'next_cursor': next_cursor,
+            'total': total
+        }))
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -89,20 +105,12 @@ def delete_comment(comment_id):
         current_user_id = get_current_user_id()
         ensure_supabase()
         
-        # 获取评论信息
-        comment = supabase_client.get_comment_by_id(comment_id)
-        if not comment:
-            return jsonify({'error': '评论不存在'}), 404
-        
-        # 检查是否为评论者
-        if comment['user_id'] != current_user_id:
+        # 按ID和评论者条件删除，未删除任何行时再区分评论不存在和无权限
+        if not supabase_client.delete_comment(comment_id, user_id=current_user_id):
+            if not supabase_client.comment_exists(comment_id):
+                return jsonify({'error': '评论不存在'}), 404
             return jsonify({'error': '无权限删除此评论'}), 403
         
-        # 删除评论
-        delete_result = supabase_client.delete_comment(comment_id)
-        if not delete_result.data:
-            return jsonify({'error': '删除失败'}), 500
-        
         return jsonify({'message': '评论删除成功'}), 200
     except Exception as e:
         logger.error(f"删除评论异常: {e}")
@@ -5,10 +5,44 @@
 from functools import wraps
 from flask import request, jsonify, g
 from models.supabase_auth_client import supabase_auth_client
+from models.supabase_client import supabase_client
+from utils.token_cache import token_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+def verify_supabase_token(access_token: str):
+    """
+    验证Supabase访问令牌
+    优先使用已验证token缓存，未命中时本地验证JWT（必要时才调用Supabase Auth），结果写回缓存
+    返回结构与 supabase_auth_client.verify_token 相同
+    """
+    revoked = token_cache.is_revoked(access_token)
+    if revoked:
+        return {
+            'success': False,
+            'valid': False,
+            'error': 'Token已失效，请重新登录'
+        }
+    
+    # 撤销记录无法确定时不使用缓存和本地验证，由Supabase Auth确认session仍然有效
+    if revoked is None:
+        return supabase_auth_client.verify_token(access_token, remote=True)
+    
+    cached = token_cache.get(access_token)
+    if cached and cached[1] == 'supabase':
+        return {
+            'success': True,
+            'user': cached[0],
+            'valid': True
+        }
+    
+    result = supabase_auth_client.verify_token(access_token)
+    if result['success'] and result['valid']:
+        token_cache.put(access_token, result['user'], 'supabase')
+        supabase_client.remember_auth_user(result['user'])
+    return result
+
 def require_auth(f):
     """
     装饰器：要求用户认证
@@ -29,8 +63,8 @@ def require_auth(f):
         # 提取token
         access_token = auth_header.split(' ')[1]
         
-        # 验证token
-        result = supabase_auth_client.verify_token(access_token)
+        # 验证token（优先使用缓存）
+        result = verify_supabase_token(access_token)
         
         if not result['success'] or not result['valid']:
             return jsonify({'error': result.get('error', 'Token无效')}), 401
@@ -76,8 +110,8 @@ def optional_auth(f):
             # 提取token
             access_token = auth_header.split(' ')[1]
             
-            # 验证token
-            result = supabase_auth_client.verify_token(access_token)
+            # 验证token（优先使用缓存）
+            result = verify_supabase_token(access_token)
             
             if result['success'] and result['valid']:
                 # 将用户信息存储到g对象中
@@ -0,0 +1,50 @@
+"""
+强ETag与条件GET
+响应体只序列化一次，ETag为响应体的SHA-256摘要；
+请求携带匹配的If-None-Match时直接返回304，不再发送响应体。
+只有缓存的文章列表（feed_cache）能跳过查询和序列化，其他接口仍需生成响应体后比较ETag，只节省传输
+"""
+import hashlib
+import json
+from typing import Any
+from flask import Response, request
+
+class EncodedJSON:
+    """已序列化的JSON响应体及其ETag，可直接放入缓存复用"""
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+
+def _dumps(payload: Any) -> bytes:
+    # 不依赖应用上下文，后台刷新缓存时也能使用
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+
+def compute_etag(data: Any) -> str:
+    """根据数据内容计算ETag"""
+    return hashlib.sha256(data if isinstance(data, bytes) else _dumps(data)).hexdigest()[:32]
+
+def encode_json(payload: Any) -> EncodedJSON:
+    """序列化响应体并由响应体计算ETag"""
+    body = _dumps(payload)
+    return EncodedJSON(body, compute_etag(body))
+
+def not_modified(etag: str) -> bool:
+    """请求的If-None-Match是否包含该ETag"""
+    return request.if_none_match.contains_weak(etag)
+
+def _with_validators(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # 允许客户端缓存，但每次使用前都需要重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def not_modified_response(etag: str) -> Response:
+    return _with_validators(Response(status=304), etag)
+
+def conditional_json(encoded: EncodedJSON, status: int = 200) -> Response:
+    """返回带ETag的JSON响应，客户端已有相同版本时返回304"""
+    if not_modified(encoded.etag):
+        return not_modified_response(encoded.etag)
+    return _with_validators(Response(encoded.body, status=status, content_type='application/json; charset=utf-8'), encoded.etag)
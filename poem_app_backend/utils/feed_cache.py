@@ -0,0 +1,107 @@
+"""
+首页/第一页文章列表的进程内缓存
+在TTL内直接返回缓存；过期后的一段时间内先返回旧数据并在后台刷新（stale-while-revalidate）；
+同一个key同时只有一次加载，文章写入时整体失效
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class FeedCache:
+    def __init__(self, ttl: float = 10, stale_ttl: float = 60):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        # key -> (value, loaded_at)
+        self._entries: Dict[Hashable, tuple] = {}
+        # 每次失效加一，失效前开始的加载结果不再写入缓存
+        self._generation = 0
+        self._refreshing = set()
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed-refresh')
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """根据应用配置设置有效期"""
+        self.ttl = app.config.get('FEED_CACHE_TTL', 10)
+        self.stale_ttl = app.config.get('FEED_CACHE_STALE_TTL', 60)
+        self.invalidate()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """返回key对应的数据，必要时调用loader加载"""
+        if self.ttl <= 0:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = now - loaded_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, loader)
+                    return value
+            self.misses += 1
+
+        value, _ = self._flight.do(key, lambda: self._load(key, loader))
+        return value
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            generation = self._generation
+            self.loads += 1
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (value, time.monotonic())
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        """后台刷新，失败时保留旧数据直到超出stale期限"""
+        try:
+            self._flight.do(key, lambda: self._load(key, loader))
+        except Exception as e:
+            logger.warning(f"后台刷新文章列表缓存失败: {key}, {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self) -> None:
+        """文章写入后清空所有列表缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'invalidations': self.invalidations,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
+
+# 全局实例
+feed_cache = FeedCache()
@@ -6,11 +6,57 @@ from functools import wraps
 from flask import request, jsonify, g, current_app
 from models.supabase_auth_client import supabase_auth_client
 from models.supabase_client import supabase_client
+from utils.token_cache import token_cache
+from utils.profile_cache import profile_cache
 import jwt
 import logging
 
 logger = logging.getLogger(__name__)
 
+class CompatUser:
+    """
+    旧系统用户的兼容对象
+    提供与Supabase Auth用户相同的常用属性
+    """
+    __slots__ = ('id', 'email', 'user_metadata', 'email_confirmed_at', 'created_at')
+
+    def __init__(self, user_data):
+        self.id = user_data['id']
+        self.email = user_data['email']
+        self.user_metadata = {'username': user_data.get('username') or ''}
+        self.email_confirmed_at = user_data.get('created_at')  # 假设已确认
+        self.created_at = user_data.get('created_at')
+
+def resolve_legacy_user(user_id: str):
+    """
+    获取旧系统用户的兼容对象，资料来自用户资料缓存
+    用户不存在或已不是旧系统用户时返回None
+    """
+    profile = supabase_client.get_profile(user_id)
+    if not profile or profile['source'] != 'legacy':
+        return None
+    return CompatUser(profile)
+
+def invalidate_legacy_user(user_id: str):
+    """旧用户迁移或删除后清除其资料缓存和已验证的旧token"""
+    profile_cache.invalidate(user_id)
+    token_cache.evict_user(user_id)
+
+def get_token_type(token: str):
+    """
+    读取未验证的JWT header和声明，判断token应交给哪个验证器
+    返回 'legacy'（旧系统HS256 token，含user_id且无iss）、'supabase'，无法解析时返回None
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+        claims = jwt.decode(token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None
+    
+    if header.get('alg') == 'HS256' and 'user_id' in claims and 'iss' not in claims:
+        return 'legacy'
+    return 'supabase'
+
 def hybrid_auth_required(f):
     """
     混合认证装饰器
@@ -31,49 +77,61 @@ def hybrid_auth_required(f):
         # 提取token
         token = auth_header.split(' ')[1]
         
-        # 首先尝试新的Supabase Auth验证
-        supabase_result = supabase_auth_client.verify_token(token)
+        # 先检查撤销记录（包括其他worker上的登出），再使用已验证token缓存
+        # 撤销记录无法确定时（None）跳过缓存，Supabase token改为远程验证
+        revoked = token_cache.is_revoked(token)
+        if revoked:
+            return jsonify({'error': 'Token已失效，请重新登录'}), 401
+        
+        cached = token_cache.get(token) if revoked is not None else None
+        if cached:
+            g.current_user, g.auth_type = cached
+            g.access_token = token
+            return f(*args, **kwargs)
+        
+        # 根据token内容直接选择验证器，避免对旧token发起注定失败的Supabase验证
+        token_type = get_token_type(token)
+        if token_type is None:
+            return jsonify({'error': 'Token无效'}), 401
         
-        if supabase_result['success'] and supabase_result['valid']:
+        if token_type == 'supabase':
+            supabase_result = supabase_auth_client.verify_token(token, remote=revoked is None)
+            
+            if not supabase_result['success'] or not supabase_result['valid']:
+                return jsonify({'error': supabase_result.get('error', 'Token无效')}), 401
+            
             # 新的Supabase Auth token有效
             g.current_user = supabase_result['user']
             g.access_token = token
             g.auth_type = 'supabase'
+            token_cache.put(token, g.current_user, g.auth_type)
+            supabase_client.remember_auth_user(g.current_user)
             logger.info(f"用户使用Supabase Auth登录: {g.current_user.email}")
             return f(*args, **kwargs)
         
-        # 尝试旧的JWT验证
+        # 旧的JWT验证
         try:
-            logger.info(f"Supabase Auth验证失败，尝试旧JWT验证")
             payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
             user_id = payload['user_id']
             
             logger.info(f"JWT解码成功，用户ID: {user_id}")
             
-            # 从旧的用户表获取用户信息
-            old_user = supabase_client.get_user_by_id(user_id)
+            # 从旧的用户表获取用户信息（带缓存）
+            old_user = resolve_legacy_user(user_id)
             
             if old_user:
-                logger.info(f"找到旧用户: {old_user.get('email', 'unknown')}, ID: {user_id}")
-                # 创建兼容的用户对象
-                class CompatUser:
-                    def __init__(self, user_data):
-                        self.id = user_data['id']
-                        self.email = user_data['email']
-                        self.user_metadata = {'username': user_data.get('username', '')}
-                        self.email_confirmed_at = user_data.get('created_at')  # 假设已确认
-                        self.created_at = user_data.get('created_at')
-                
-                g.current_user = CompatUser(old_user)
+                g.current_user = old_user
                 g.access_token = token
                 g.auth_type = 'legacy'
+                token_cache.put(token, g.current_user, g.auth_type)
                 
                 # 记录旧系统使用情况，用于迁移监控
-                logger.warning(f"用户仍在使用旧认证系统: {old_user['email']}")
+                logger.warning(f"用户仍在使用旧认证系统: {old_user.email}")
                 
                 return f(*args, **kwargs)
             else:
-                return jsonify({'error': '用户不存在'}), 404
+                # 旧用户记录已删除，通常是已迁移到Supabase Auth，需要用新账户重新登录
+                return jsonify({'error': '账户已升级，请重新登录', 'needs_relogin': True}), 401
                 
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token已过期，请重新登录'}), 401
@@ -0,0 +1,108 @@
+"""
+文章AI配图后台任务
+创建文章后立即返回，配图在后台线程池中生成并回写image_url，
+客户端通过状态接口轮询结果
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from models.supabase_client import supabase_client
+from utils.ai_image_generator import ai_generator
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+
+class ImageJobQueue:
+    def __init__(self, max_workers: int = 2, job_timeout: int = 300):
+        self._configure(max_workers, job_timeout)
+
+    def init_app(self, app):
+        """根据应用配置重建线程池"""
+        self._executor.shutdown(wait=False)
+        self._configure(app.config.get('IMAGE_WORKERS', 2), app.config.get('IMAGE_JOB_TIMEOUT', 300))
+
+    def _configure(self, max_workers, job_timeout):
+        self.max_workers = max_workers
+        self.job_timeout = job_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='article-image')
+        self._lock = threading.Lock()
+        # 文章ID -> 任务状态，完成后保留一小时供客户端查询
+        self._jobs = TTLCache(maxsize=4096, ttl=3600)
+        self.submitted = 0
+        self.ready = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+
+    def submit(self, article: Dict[str, Any]) -> Dict[str, Any]:
+        """提交配图任务，返回初始状态"""
+        job = {'status': IMAGE_PENDING, 'image_url': None}
+        self._jobs.set(article['id'], job)
+        with self._lock:
+            self.submitted += 1
+        self._executor.submit(self._run, article)
+        return job
+
+    def _run(self, article: Dict[str, Any]) -> None:
+        started = time.monotonic()
+        image_url = None
+        try:
+            image_url = ai_generator.generate_poem_image(article)
+            if image_url:
+                updated = supabase_client.update_article_image(article['id'], image_url)
+                if updated:
+                    image_url = updated.get('image_url') or image_url
+        except Exception as e:
+            logger.error(f"文章配图生成失败: {article['id']}, {e}")
+            image_url = None
+
+        status = IMAGE_READY if image_url else IMAGE_FAILED
+        self._jobs.set(article['id'], {'status': status, 'image_url': image_url})
+        with self._lock:
+            self.total_seconds += time.monotonic() - started
+            if image_url:
+                self.ready += 1
+            else:
+                self.failed += 1
+        logger.info(f"文章配图任务完成: {article['id']}, 状态: {status}")
+
+    def status(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """本进程提交过的任务状态，未知时返回None"""
+        return self._jobs.get(article_id)
+
+    def infer_status(self, article: Dict[str, Any]) -> str:
+        """
+        根据文章数据推断状态，用于任务由其他进程提交或进程已重启的情况：
+        已有图片为ready，创建时间在任务超时时间内为pending，否则为failed
+        """
+        if article.get('image_url'):
+            return IMAGE_READY
+        created_at = article.get('created_at') or ''
+        try:
+            created = datetime.fromisoformat(created_at[:19])
+        except ValueError:
+            return IMAGE_FAILED
+        if (datetime.utcnow() - created).total_seconds() < self.job_timeout:
+            return IMAGE_PENDING
+        return IMAGE_FAILED
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.ready + self.failed
+            return {
+                'workers': self.max_workers,
+                'submitted': self.submitted,
+                'pending': self.submitted - finished,
+                'ready': self.ready,
+                'failed': self.failed,
+                'avg_seconds': round(self.total_seconds / finished, 2) if finished else 0.0
+            }
+
+# 全局实例
+image_jobs = ImageJobQueue()
@@ -0,0 +1,105 @@
+"""
+旧系统用户登录时迁移
+旧系统登录成功后，在同一请求中用刚验证过的密码创建Supabase Auth用户、转移文章和评论并删除旧用户记录，
+直接返回Supabase session，让旧用户逐步离开双重认证的慢路径。
+Supabase开启邮箱验证时不自动迁移：注册会给用户发送意外的验证邮件，且在验证前无法转移数据
+"""
+import threading
+import logging
+from typing import Any, Dict, Optional
+from models.supabase_auth_client import supabase_auth_client
+from models.supabase_client import supabase_client
+from utils.hybrid_auth_middleware import invalidate_legacy_user
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class LegacyMigrator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 正在迁移的旧用户，同一用户的并发登录不重复迁移
+        self._in_progress = set()
+        # 迁移失败的旧用户，一小时内不重复尝试
+        self._failed = TTLCache(maxsize=10000, ttl=3600)
+        # 剩余旧用户数量的短期缓存，避免每次查询统计都计数
+        self._remaining = TTLCache(maxsize=1, ttl=60)
+        self.counters = {
+            'migrated': 0,
+            'skipped_confirmation': 0,
+            'failed': 0
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def migrate(self, old_user: Dict[str, Any], password: str) -> Optional[Dict[str, Any]]:
+        """
+        迁移旧用户，成功时返回 {'user', 'session'}（与Supabase登录结果一致）
+        需要邮箱验证、同一用户正在迁移、近期失败过或迁移失败时返回None，调用方继续使用旧系统登录
+        """
+        if not supabase_auth_client.email_autoconfirm():
+            self._count('skipped_confirmation')
+            return None
+
+        with self._lock:
+            if old_user['id'] in self._in_progress or self._failed.get(old_user['id']):
+                return None
+            self._in_progress.add(old_user['id'])
+        try:
+            result = self._migrate(old_user, password)
+        finally:
+            with self._lock:
+                self._in_progress.discard(old_user['id'])
+        if result is None:
+            self._failed.set(old_user['id'], True)
+            self._count('failed')
+        return result
+
+    def _migrate(self, old_user: Dict[str, Any], password: str) -> Optional[Dict[str, Any]]:
+        email = old_user['email']
+        try:
+            username = old_user.get('username') or email.split('@')[0]
+            result = supabase_auth_client.sign_up(email, password, username)
+            if not result['success']:
+                # 之前的迁移已创建Supabase用户但未完成数据转移时，用同一密码登录后继续
+                result = supabase_auth_client.sign_in(email, password)
+                if not result['success']:
+                    logger.warning(f"迁移创建用户失败: {email}, 错误: {result.get('error')}")
+                    return None
+
+            # 设置刚改为需要邮箱验证时不会有session，此时不转移数据
+            if not result['session']:
+                logger.warning(f"迁移未获得session，可能需要邮箱验证: {email}")
+                return None
+
+            supabase_client.migrate_legacy_user_data(old_user['id'], result['user'].id)
+            invalidate_legacy_user(old_user['id'])
+            self._remaining.clear()
+            self._count('migrated')
+            logger.info(f"旧用户迁移成功: {email}")
+            return {'user': result['user'], 'session': result['session']}
+        except Exception as e:
+            logger.error(f"旧用户迁移异常: {email}, {e}")
+            return None
+
+    def remaining_legacy_users(self):
+        """仍在旧用户表中的用户数量，查询失败时返回None"""
+        remaining = self._remaining.get('count')
+        if remaining is None:
+            try:
+                remaining = supabase_client.count_legacy_users()
+            except Exception as e:
+                logger.error(f"统计旧用户数量失败: {e}")
+                return None
+            self._remaining.set('count', remaining)
+        return remaining
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats['remaining_legacy_users'] = self.remaining_legacy_users()
+        return stats
+
+# 全局实例
+legacy_migrator = LegacyMigrator()
@@ -0,0 +1,63 @@
+"""
+基于 (created_at, id) 的游标分页
+游标对客户端是不透明的字符串，内容为最后一行的 created_at 和 id
+"""
+import base64
+import json
+import re
+from typing import Optional, Tuple
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+# 游标中的值会拼进PostgREST过滤条件，只接受时间戳和ID允许出现的字符
+_TIMESTAMP_RE = re.compile(r'^[0-9T:.+\- Z]{10,40}$')
+_ID_RE = re.compile(r'^[\w-]{1,64}$')
+
+class InvalidCursor(ValueError):
+    pass
+
+def clamp_per_page(per_page: Optional[int], default: int = DEFAULT_PER_PAGE, maximum: int = MAX_PER_PAGE) -> int:
+    """将每页数量限制在 1 ~ maximum 之间"""
+    if not per_page or per_page < 1:
+        return default
+    return min(per_page, maximum)
+
+def encode_cursor(row: dict) -> str:
+    """根据一行数据生成下一页游标"""
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游标，返回 (created_at, id)，格式不正确时抛出InvalidCursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise InvalidCursor('无效的分页游标')
+    if not isinstance(created_at, str) or not isinstance(row_id, str) \
+            or not _TIMESTAMP_RE.match(created_at) or not _ID_RE.match(row_id):
+        raise InvalidCursor('无效的分页游标')
+    return created_at, row_id
+
+def apply_keyset(query, cursor: Optional[str], limit: int, foreign_table: Optional[str] = None):
+    """
+    按 created_at DESC, id DESC 排序并从游标位置之后取 limit 行
+    需要 (created_at DESC, id DESC) 索引才能保证深页的查询时间不变
+    foreign_table 不为空时作用于select中嵌入的关联表
+    """
+    prefix = f'{foreign_table}.' if foreign_table else ''
+    query.params = query.params.add(f'{prefix}order', 'created_at.desc,id.desc')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query.params = query.params.add(
+            f'{prefix}or', f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}"))'
+        )
+    return query.limit(limit, foreign_table=foreign_table)
+
+def split_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    """多取一行判断是否还有下一页，返回 (本页数据, 下一页游标)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,109 @@
+"""
+bcrypt密码校验线程池
+bcrypt校验刻意消耗CPU，集中到有界线程池中执行，并限制排队数量，
+避免旧系统登录高峰占满请求线程
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import time
+import bcrypt
+from typing import Any, Dict
+
+class PasswordCheckBusy(Exception):
+    """线程池和等待队列都已满"""
+
+class _Timing:
+    """累计耗时统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+class BcryptPool:
+    def __init__(self, max_workers: int = 2, max_queue: int = 8, timeout: float = 10, retry_after: int = 2):
+        self._configure(max_workers, max_queue, timeout, retry_after)
+
+    def init_app(self, app):
+        """根据应用配置重建线程池"""
+        self._executor.shutdown(wait=False)
+        self._configure(
+            app.config.get('BCRYPT_WORKERS', 2),
+            app.config.get('BCRYPT_QUEUE_LIMIT', 8),
+            app.config.get('BCRYPT_TIMEOUT', 10),
+            app.config.get('BCRYPT_RETRY_AFTER', 2)
+        )
+
+    def _configure(self, max_workers, max_queue, timeout, retry_after):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        # 正在执行和排队的任务总数上限
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._queue_wait = _Timing()
+        self._hash_time = _Timing()
+        self.rejected = 0
+
+    def _check(self, password: bytes, password_hash: bytes, submitted_at: float) -> bool:
+        started_at = time.perf_counter()
+        try:
+            return bcrypt.checkpw(password, password_hash)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._queue_wait.add(started_at - submitted_at)
+                self._hash_time.add(finished_at - started_at)
+
+    def checkpw(self, password: str, password_hash: str) -> bool:
+        """
+        在线程池中校验密码
+        线程池已满时抛出PasswordCheckBusy，调用方应返回503
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordCheckBusy()
+        try:
+            future = self._executor.submit(
+                self._check,
+                password.encode('utf-8'),
+                password_hash.encode('utf-8'),
+                time.perf_counter()
+            )
+        except Exception:
+            self._slots.release()
+            raise
+        # 任务真正结束后才释放名额，等待超时的任务仍然占用线程池
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordCheckBusy()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'rejected': self.rejected,
+                'queue_wait': self._queue_wait.to_dict(),
+                'hash_time': self._hash_time.to_dict()
+            }
+
+# 全局实例
+bcrypt_pool = BcryptPool()
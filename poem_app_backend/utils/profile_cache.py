@@ -0,0 +1,86 @@
+"""
+进程内用户资料缓存
+按用户ID缓存旧系统users表和Supabase Auth用户（user_profiles / 认证元数据）的基本资料，
+LRU + TTL淘汰，支持批量获取，未命中的ID由调用方提供的加载函数一次性查询
+"""
+from typing import Any, Callable, Dict, Iterable, Optional
+from utils.ttl_cache import TTLCache
+
+PROFILE_FIELDS = ('id', 'email', 'username', 'display_name', 'created_at', 'source')
+
+# 已查询过但不存在的用户，避免已删除用户的评论每次都触发查询
+_NOT_FOUND = object()
+
+# 注册时间不会变化，单独长期缓存，资料过期后 /me 仍无需查询
+CREATED_AT_TTL = 7 * 24 * 3600
+
+class ProfileCache:
+    def __init__(self, maxsize: int = 2048, ttl: float = 300):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._created_at = TTLCache(maxsize=maxsize * 4, ttl=CREATED_AT_TTL)
+        self.loads = 0
+
+    def init_app(self, app):
+        """根据应用配置重建缓存"""
+        maxsize = app.config.get('PROFILE_CACHE_SIZE', 2048)
+        self._cache = TTLCache(maxsize=maxsize, ttl=app.config.get('PROFILE_CACHE_TTL', 300))
+        self._created_at = TTLCache(maxsize=maxsize * 4, ttl=CREATED_AT_TTL)
+
+    def _store(self, user_id: str, profile: Any) -> None:
+        self._cache.set(user_id, profile)
+        if profile is not _NOT_FOUND and profile.get('created_at') is not None:
+            self._created_at.set(user_id, profile['created_at'])
+
+    def get_many(self, user_ids: Iterable[str],
+                 load_many: Callable[[list], Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取用户资料，返回 {用户ID: 资料}，不存在的用户不在结果中
+        未命中的ID合并为一次load_many调用
+        """
+        profiles = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            if not user_id:
+                continue
+            profile = self._cache.get(user_id)
+            if profile is None:
+                missing.append(user_id)
+            elif profile is not _NOT_FOUND:
+                profiles[user_id] = profile
+        if missing:
+            self.loads += 1
+            loaded = load_many(missing)
+            for user_id in missing:
+                profile = loaded.get(user_id)
+                self._store(user_id, _NOT_FOUND if profile is None else profile)
+                if profile is not None:
+                    profiles[user_id] = profile
+        return profiles
+
+    def get(self, user_id: str, load_many: Callable[[list], Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        return self.get_many([user_id], load_many).get(user_id)
+
+    def peek(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """只读取缓存，不触发加载"""
+        profile = self._cache.get(user_id)
+        return None if profile is _NOT_FOUND else profile
+
+    def put(self, profile: Dict[str, Any]) -> None:
+        self._store(profile['id'], profile)
+
+    def created_at(self, user_id: str) -> Optional[str]:
+        """长期缓存的注册时间，资料条目过期后仍可用"""
+        return self._created_at.get(user_id)
+
+    def invalidate(self, user_id: str) -> None:
+        """用户名或资料变更、旧用户迁移后清除缓存"""
+        self._cache.pop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats['loads'] = self.loads
+        stats['created_at_size'] = len(self._created_at)
+        return stats
+
+# 全局实例
+profile_cache = ProfileCache()
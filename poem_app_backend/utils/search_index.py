@@ -0,0 +1,234 @@
+"""
+文章全文搜索的进程内倒排索引
+中文按单字和相邻双字（bigram）切分，英文和数字按整词切分；
+标题、作者、标签、正文按不同权重计分，按TF-IDF排序。
+首次搜索时从数据库全量加载，之后由文章写入方法增量更新，并定期在后台重建以同步其他进程的写入
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+_CJK_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+
+FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'tags': 2.0, 'content': 1.0}
+SUMMARY_FIELDS = ('id', 'title', 'author', 'tags', 'image_url', 'like_count', 'comment_count', 'created_at')
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize('NFKC', text).lower()
+
+def tokenize(text: str) -> List[str]:
+    """索引用切分：中文输出单字和双字，英文数字输出整词"""
+    tokens = []
+    for run in _TOKEN_RE.findall(_normalize(text or '')):
+        if _CJK_RE.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def tokenize_query(text: str) -> List[str]:
+    """查询用切分：中文连续两字以上只用双字，保证近似按短语匹配"""
+    tokens = []
+    for run in _TOKEN_RE.findall(_normalize(text or '')):
+        if _CJK_RE.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return list(dict.fromkeys(tokens))
+
+def _field_weights(article: Dict[str, Any]) -> Dict[str, float]:
+    """文章中每个token的加权词频"""
+    weights: Dict[str, float] = defaultdict(float)
+    for field, field_weight in FIELD_WEIGHTS.items():
+        value = article.get(field)
+        if field == 'tags':
+            value = ' '.join(value or [])
+        counts: Dict[str, int] = defaultdict(int)
+        for token in tokenize(value or ''):
+            counts[token] += 1
+        for token, count in counts.items():
+            weights[token] += field_weight * (1 + math.log(count))
+    return weights
+
+class _InvertedIndex:
+    """倒排表和文章摘要，本身不加锁"""
+
+    def __init__(self):
+        # token -> {文章ID: 权重}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # 文章ID -> (摘要, 该文章的token集合)
+        self.docs: Dict[str, Tuple[Dict[str, Any], frozenset]] = {}
+
+    def add(self, article: Dict[str, Any]) -> None:
+        self.remove(article['id'])
+        weights = _field_weights(article)
+        summary = {field: article.get(field) for field in SUMMARY_FIELDS}
+        summary['excerpt'] = article.get('excerpt', '')
+        for token, weight in weights.items():
+            self.postings[token][article['id']] = weight
+        self.docs[article['id']] = (summary, frozenset(weights))
+
+    def remove(self, article_id: str) -> None:
+        entry = self.docs.pop(article_id, None)
+        if not entry:
+            return
+        for token in entry[1]:
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(article_id, None)
+                if not postings:
+                    del self.postings[token]
+
+class ArticleSearchIndex:
+    def __init__(self, rebuild_interval: float = 600):
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-index')
+        self._index = _InvertedIndex()
+        self.loaded_at: Optional[float] = None
+        self._building = False
+        self._rebuilding = False
+        # 全量加载期间发生的写入，加载完成后重放
+        self._pending: List[Tuple[str, Any]] = []
+        self.builds = 0
+        self.last_build_seconds = 0.0
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    def init_app(self, app):
+        self.rebuild_interval = app.config.get('SEARCH_INDEX_REBUILD_INTERVAL', 600)
+
+    def add(self, article: Dict[str, Any], excerpt: str = '') -> None:
+        """新增或更新文章（需要包含正文），索引尚未加载时忽略"""
+        article = dict(article, excerpt=excerpt)
+        with self._lock:
+            if self._building:
+                self._pending.append(('add', article))
+            if self.loaded_at is not None:
+                self._index.add(article)
+
+    def remove(self, article_id: str) -> None:
+        with self._lock:
+            if self._building:
+                self._pending.append(('remove', article_id))
+            if self.loaded_at is not None:
+                self._index.remove(article_id)
+
+    def build(self, articles: Iterable[Dict[str, Any]], excerpt: Callable[[str], str]) -> None:
+        """全量重建，完成后替换当前索引并重放重建期间的写入"""
+        started = time.monotonic()
+        with self._lock:
+            self._building = True
+            self._pending = []
+        fresh = _InvertedIndex()
+        try:
+            for article in articles:
+                fresh.add(dict(article, excerpt=excerpt(article.get('content'))))
+        except Exception:
+            with self._lock:
+                self._building = False
+                self._pending = []
+            raise
+        with self._lock:
+            for action, value in self._pending:
+                if action == 'add':
+                    fresh.add(value)
+                else:
+                    fresh.remove(value)
+            self._index = fresh
+            self._pending = []
+            self._building = False
+            self.loaded_at = time.monotonic()
+            self.builds += 1
+            self.last_build_seconds = time.monotonic() - started
+        logger.info(f"搜索索引重建完成: {len(fresh.docs)} 篇文章, 耗时 {self.last_build_seconds:.2f}s")
+
+    def ensure_loaded(self, loader: Callable[[], Iterable[Dict[str, Any]]], excerpt: Callable[[str], str]) -> None:
+        """首次使用时同步加载；超过重建间隔时在后台重建，期间继续使用旧索引"""
+        if self.loaded_at is None:
+            with self._load_lock:
+                if self.loaded_at is None:
+                    self.build(loader(), excerpt)
+            return
+        if time.monotonic() - self.loaded_at < self.rebuild_interval:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        self._executor.submit(self._background_rebuild, loader, excerpt)
+
+    def warm(self, loader: Callable[[], Iterable[Dict[str, Any]]], excerpt: Callable[[str], str]) -> None:
+        """启动时在后台加载索引，首次搜索不必等待全量加载（加载未完成时仍会等待其完成）"""
+        with self._lock:
+            if self.loaded_at is not None or self._rebuilding:
+                return
+            self._rebuilding = True
+        self._executor.submit(self._background_rebuild, loader, excerpt)
+
+    def _background_rebuild(self, loader, excerpt) -> None:
+        try:
+            with self._load_lock:
+                self.build(loader(), excerpt)
+        except Exception as e:
+            logger.error(f"搜索索引后台重建失败: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> Tuple[List[Dict[str, Any]], int]:
+        """返回 (本页结果, 命中总数)，所有查询词都必须命中"""
+        started = time.monotonic()
+        tokens = tokenize_query(query)
+        with self._lock:
+            results: List[Tuple[float, str, Dict[str, Any]]] = []
+            index = self._index
+            postings = [index.postings.get(token) for token in tokens]
+            if tokens and all(postings):
+                postings.sort(key=len)
+                total_docs = len(index.docs)
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    candidates.intersection_update(posting)
+                    if not candidates:
+                        break
+                idf = [math.log(1 + total_docs / len(posting)) for posting in postings]
+                for article_id in candidates:
+                    score = sum(posting[article_id] * weight for posting, weight in zip(postings, idf))
+                    summary = index.docs[article_id][0]
+                    results.append((score, summary.get('created_at') or '', summary))
+            self.searches += 1
+        # 只需要排出前 offset+limit 条
+        top = heapq.nlargest(offset + limit, results, key=lambda item: (item[0], item[1]))
+        page = [dict(summary, score=round(score, 3)) for score, _, summary in top[offset:]]
+        with self._lock:
+            self.search_seconds += time.monotonic() - started
+        return page, len(results)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'loaded': self.loaded_at is not None,
+                'age_seconds': round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+                'documents': len(self._index.docs),
+                'tokens': len(self._index.postings),
+                'builds': self.builds,
+                'last_build_seconds': round(self.last_build_seconds, 3),
+                'searches': self.searches,
+                'avg_search_ms': round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0
+            }
+
+# 全局实例
+search_index = ArticleSearchIndex()
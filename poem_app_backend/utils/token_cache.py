@@ -0,0 +1,208 @@
+"""
+已验证token缓存
+以token的SHA-256摘要为键缓存解析出的用户对象和认证类型，避免同一token重复验证。
+登出撤销写入所有worker共享的存储（数据库revoked_tokens表），各worker每隔几秒增量同步到本地，
+本地验证和缓存都会先检查撤销记录。
+撤销记录只在token过期时删除，不会因容量被提前淘汰；超出容量时无法确定的token交给远程验证
+"""
+import hashlib
+import logging
+import threading
+import time
+import jwt
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 撤销记录按写入时间增量同步，多取一段时间以容忍数据库与本机的时钟偏差和提交延迟
+REVOCATION_SYNC_OVERLAP = 30
+# 同步失败（如撤销表尚未创建）后的重试间隔
+REVOCATION_RETRY_SECONDS = 30
+
+class RevocationSet:
+    """
+    撤销记录：撤销键 -> token过期的Unix时间戳，线程安全
+    记录只在过期后清理；达到上限时拒绝新记录并进入溢出状态，
+    直到被拒绝的记录全部过期前，不在集合中的token都视为无法确定
+    """
+
+    def __init__(self, limit: int = 100000):
+        self.limit = limit
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._overflow_until = 0.0
+        self.rejected = 0
+
+    def _purge(self, now: float) -> None:
+        expired = [key for key, expires_at in self._expires.items() if expires_at <= now]
+        for key in expired:
+            del self._expires[key]
+
+    def add(self, key: str, expires_at: float) -> None:
+        now = time.time()
+        if expires_at <= now:
+            return
+        with self._lock:
+            if key not in self._expires and len(self._expires) >= self.limit:
+                self._purge(now)
+                if len(self._expires) >= self.limit:
+                    self.rejected += 1
+                    self._overflow_until = max(self._overflow_until, expires_at)
+                    return
+            self._expires[key] = max(self._expires.get(key, 0), expires_at)
+
+    def contains(self, key: str) -> Optional[bool]:
+        """已撤销返回True，未撤销返回False，溢出期间无法确定时返回None"""
+        now = time.time()
+        with self._lock:
+            expires_at = self._expires.get(key)
+            if expires_at is not None and expires_at > now:
+                return True
+            if now < self._overflow_until:
+                return None
+            return False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires.clear()
+            self._overflow_until = 0.0
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    @property
+    def overflowing(self) -> bool:
+        return time.time() < self._overflow_until
+
+class VerifiedTokenCache:
+    def __init__(self, maxsize: int = 4096, ttl: float = 300):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # 已登出的token在过期前保留一条撤销记录，防止被本地验证重新接受
+        self._revoked = RevocationSet()
+        self.sync_interval = 1.0
+        # 共享撤销存储：save(token)，load(起始时间戳或None) -> [{'key', 'expires_at'}]
+        self._save: Optional[Callable[[str], None]] = None
+        self._load: Optional[Callable[[Optional[float]], Iterable[Dict[str, Any]]]] = None
+        self._sync_lock = threading.Lock()
+        self._next_sync = 0.0
+        self._synced_since: Optional[float] = None
+        self.syncs = 0
+        self.sync_errors = 0
+
+    def init_app(self, app):
+        """根据应用配置重建缓存"""
+        maxsize = app.config.get('TOKEN_CACHE_SIZE', 4096)
+        self._cache = TTLCache(maxsize=maxsize, ttl=app.config.get('TOKEN_CACHE_TTL', 300))
+        self._revoked = RevocationSet(app.config.get('TOKEN_REVOCATION_LIMIT', 100000))
+        self.sync_interval = app.config.get('TOKEN_REVOCATION_SYNC_INTERVAL', 1.0)
+        self._next_sync = 0.0
+        self._synced_since = None
+
+    def attach_store(self, save: Callable[[str], None],
+                     load: Callable[[Optional[float]], Iterable[Dict[str, Any]]]) -> None:
+        """设置共享撤销存储，未设置时撤销只在本进程生效"""
+        self._save = save
+        self._load = load
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _unverified_claims(token: str) -> Dict[str, Any]:
+        """读取token自身的声明（token已验证过或只用于撤销检查，这里不再校验签名）"""
+        try:
+            return jwt.decode(token, options={'verify_signature': False})
+        except jwt.InvalidTokenError:
+            return {}
+
+    @classmethod
+    def _seconds_until_expiry(cls, token: str) -> float:
+        exp = cls._unverified_claims(token).get('exp')
+        return exp - time.time() if exp else 0
+
+    @classmethod
+    def _revocation_key(cls, token: str) -> str:
+        """Supabase token按session撤销（同一session刷新出的token一并失效），其他token按自身撤销"""
+        session_id = cls._unverified_claims(token).get('session_id')
+        if session_id:
+            return hashlib.sha256(f'session:{session_id}'.encode('utf-8')).hexdigest()
+        return cls._key(token)
+
+    def get(self, token: str) -> Optional[Tuple[Any, str]]:
+        """返回 (用户对象, 认证类型)，未命中时返回None"""
+        return self._cache.get(self._key(token))
+
+    def put(self, token: str, user: Any, auth_type: str) -> None:
+        """缓存验证结果，有效期不超过token自身的exp"""
+        self._cache.set(self._key(token), (user, auth_type), ttl=self._seconds_until_expiry(token))
+
+    def evict(self, token: str) -> None:
+        self._cache.pop(self._key(token))
+
+    def evict_user(self, user_id: str) -> int:
+        """移除某个用户的所有缓存条目（如旧用户迁移后）"""
+        return self._cache.pop_where(lambda entry: getattr(entry[0], 'id', None) == user_id)
+
+    def revoke(self, token: str) -> None:
+        """登出时立即移除缓存条目，记录撤销直到token过期，并写入共享存储通知其他worker"""
+        self._cache.pop(self._key(token))
+        claims = self._unverified_claims(token)
+        exp = claims.get('exp') or 0
+        self._revoked.add(self._revocation_key(token), exp)
+        # 共享存储按session记录，由数据库根据token自身的声明计算撤销键
+        if self._save is not None and claims.get('session_id') and exp > time.time():
+            try:
+                self._save(token)
+            except Exception as e:
+                logger.error(f"写入token撤销记录失败: {e}")
+
+    def is_revoked(self, token: str) -> Optional[bool]:
+        """
+        已撤销返回True，未撤销返回False
+        撤销记录溢出、无法确定时返回None，调用方应跳过缓存并远程验证token
+        """
+        self._sync()
+        return self._revoked.contains(self._revocation_key(token))
+
+    def _sync(self) -> None:
+        """距上次同步超过间隔时拉取新的撤销记录；其他线程正在同步时直接使用本地记录"""
+        if self._load is None or time.monotonic() < self._next_sync:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self._next_sync:
+                return
+            started = time.time()
+            try:
+                rows = self._load(self._synced_since)
+            except Exception as e:
+                self.sync_errors += 1
+                self._next_sync = time.monotonic() + REVOCATION_RETRY_SECONDS
+                logger.error(f"同步token撤销记录失败: {e}")
+                return
+            for row in rows:
+                self._revoked.add(row['key'], row['expires_at'])
+            self._synced_since = started - REVOCATION_SYNC_OVERLAP
+            self._next_sync = time.monotonic() + self.sync_interval
+            self.syncs += 1
+        finally:
+            self._sync_lock.release()
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats['revoked'] = len(self._revoked)
+        stats['revocations_rejected'] = self._revoked.rejected
+        stats['revocations_overflowing'] = self._revoked.overflowing
+        stats['revocation_store'] = self._load is not None
+        stats['revocation_syncs'] = self.syncs
+        stats['revocation_sync_errors'] = self.sync_errors
+        return stats
+
+# 全局实例
+token_cache = VerifiedTokenCache()